@@ -6,10 +6,80 @@
 # Imports
 import os
 import sys
+import time
+import json
 import argparse
 import logging
-import configparser
-import requests
+import importlib
+import threading
+
+
+
+
+# Thin client
+# With --viaDaemon, the task is sent to a running daemon (see the 'daemon' task) before edgecase_client is imported, so that this process only needs socket and json. The protocol is the one in edgecase_client/code/daemon.py: one line of JSON each way.
+default_socket_path = '.edgecase_daemon.sock'
+daemon_timeout = 600  # seconds
+
+
+
+
+def socket_path_arg(argv):
+  # Find the value of --socket in argv, without argparse.
+  socket_path = default_socket_path
+  for i, arg in enumerate(argv):
+    if arg == '--socket' and i + 1 < len(argv):
+      socket_path = argv[i + 1]
+    elif arg.startswith('--socket='):
+      socket_path = arg.split('=', 1)[1]
+  return socket_path
+
+
+
+
+def forward_to_daemon(argv, socket_path):
+  # Send the task to the daemon, print its output, and exit with its exit code.
+  import socket
+  request = {
+    'argv': [x for x in argv if x != '--viaDaemon'],
+    'cwd': os.getcwd(),
+  }
+  s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  s.settimeout(daemon_timeout)
+  try:
+    try:
+      s.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+      msg = "No daemon is listening on {}. Start one with: python3 cli.py --task daemon".format(socket_path)
+      print(msg, file=sys.stderr)
+      sys.exit(1)
+    try:
+      f = s.makefile('rwb')
+      f.write(json.dumps(request).encode('utf-8') + b'\n')
+      f.flush()
+      line = f.readline()
+      f.close()
+    except OSError as e:
+      # E.g. the daemon is shutting down.
+      line = b''
+  finally:
+    s.close()
+  if not line:
+    print("The daemon closed the connection without a response.", file=sys.stderr)
+    sys.exit(1)
+  response = json.loads(line.decode('utf-8'))
+  if 'error' in response:
+    print(response['error'], file=sys.stderr)
+    sys.exit(1)
+  sys.stdout.write(response['output'])
+  sys.stdout.flush()
+  sys.exit(response['exit_code'])
+
+
+
+
+if __name__ == '__main__' and '--viaDaemon' in sys.argv[1:]:
+  forward_to_daemon(sys.argv[1:], socket_path_arg(sys.argv[1:]))
 
 
 
@@ -26,9 +96,6 @@ isfile = os.path.isfile
 isdir = os.path.isdir
 join = os.path.join
 basename = os.path.basename
-edgecase_article = edgecase_client.submodules.edgecase_article
-stateless_gpg = edgecase_article.edgecase_article.submodules.stateless_gpg
-gpg = stateless_gpg.gpg
 
 
 
@@ -45,7 +112,6 @@ deb = logger.debug
 
 # Settings
 time_to_wait = 3  # seconds
-edgecase_public_key_file_name = 'edgecase_datafeed_2_public_key.txt'
 domain = 'edgecase.net'
 
 
@@ -57,11 +123,40 @@ ttw = time_to_wait
 
 
 
+# Task requirements:
+# - config: The task needs config.ini (and therefore a Client).
+# - api: The task talks to the Edgecase node (and therefore needs the requests library).
+# - article: The task needs the edgecase_article / stateless_gpg stack.
+# Each task loads only what it needs, so that simple tasks start quickly.
+task_requirements = {
+  'hello': '',
+  'benchmark': '',
+  'listDrafts': 'config api',
+  'deleteDraft': 'config api',
+  'uploadDraft': 'config api article',
+  'uploadAssets': 'config api',
+  'uploadDrafts': 'config api article',
+  'signDraft': 'config article',
+  'signDrafts': 'config article',
+  'syncDrafts': 'config api article',
+  'watchDrafts': 'config api article',
+  'auditFileNames': '',
+  'verifyArchive': 'article',
+  'mockNode': '',
+  'daemon': '',
+  'stopDaemon': '',
+  'loadTest': 'api',
+}
+
+
+
+
 def setup(
     log_level = 'error',
     debug = False,
     log_timestamp = False,
     log_file = None,
+    load_article = False,
     ):
   logger_name = 'cli'
   # Configure logger for this module.
@@ -84,7 +179,10 @@ def setup(
     log_file = log_file,
   )
   # Set edgecase_article logger to always be ERROR.
-  edgecase_client.submodules.edgecase_article.setup(
+  if not load_article:
+    return
+  edgecase_article = edgecase_client.code.client.load_edgecase_article()
+  edgecase_article.setup(
     log_level = log_level,
     debug = debug,
     log_timestamp = log_timestamp,
@@ -94,7 +192,18 @@ def setup(
 
 
 
-def main():
+# Daemon mode:
+# - When this process is running the 'daemon' task, daemon_clients holds a Client for each distinct set of client settings, so that config, keys and connections are reused across requests.
+# - Forwarded tasks run one at a time, in the requester's working directory.
+daemon_clients = None
+daemon_lock = threading.Lock()
+# Long-running tasks can't be forwarded to the daemon.
+daemon_excluded_tasks = 'daemon stopDaemon mockNode watchDrafts'.split()
+
+
+
+
+def main(argv=None):
 
   # Note: We use camelCase for option names because it's faster to type.
 
@@ -114,6 +223,48 @@ def main():
     default='drafts/article.txt',
   )
 
+  parser.add_argument(
+    '--articles',
+    help="Directory or glob pattern of article files, used by batch tasks (default: '%(default)s').",
+    default='drafts',
+  )
+
+  parser.add_argument(
+    '-w', '--workers', type=int,
+    help="Number of concurrent workers and in-flight requests, used by batch tasks (default: '%(default)s').",
+    default=8,
+  )
+
+  parser.add_argument(
+    '--retries', type=int,
+    help="Number of times to retry an idempotent node request (list, delete, asset metadata) after a transient failure (default: '%(default)s').",
+    default=3,
+  )
+
+  parser.add_argument(
+    '--hedge', dest='hedge_after', type=float,
+    help="If a list request hasn't returned after this many seconds, send it again and use the first response (default: off).",
+    default=None,
+  )
+
+  parser.add_argument(
+    '--fanOut', dest='fan_out', type=int,
+    help="Send each list request to this many nodes at once, and use the first response (default: '%(default)s').",
+    default=1,
+  )
+
+  parser.add_argument(
+    '--latencies',
+    action='store_true',
+    help="After the task, print the latency percentiles of the node requests that it made.",
+  )
+
+  parser.add_argument(
+    '--articleType', dest='article_type',
+    help="Type of the articles in the archive, used by the 'verifyArchive' task (default: '%(default)s').",
+    default='signed_article',
+  )
+
   parser.add_argument(
     '-n', '--name',
     help="Name of article, page, or draft (default: '%(default)s').",
@@ -138,6 +289,149 @@ def main():
     default='signed_articles',
   )
 
+  parser.add_argument(
+    '--domain',
+    help="Domain (and optional port) of the Edgecase node, or several, separated by commas. Overrides the [node] section of config.ini (default: '{}').".format(domain),
+    default=None,
+  )
+
+  parser.add_argument(
+    '--port', type=int,
+    help="Port for the 'mockNode' task to listen on (default: '%(default)s').",
+    default=8765,
+  )
+
+  parser.add_argument(
+    '--latency', type=float,
+    help="Delay in seconds that the mock node adds to each response (default: '%(default)s').",
+    default=0,
+  )
+
+  parser.add_argument(
+    '--errorRate', dest='error_rate', type=float,
+    help="Fraction of requests that the mock node answers with a 503 error (default: '%(default)s').",
+    default=0,
+  )
+
+  parser.add_argument(
+    '--unwrapKeyFile', dest='unwrap_key_file',
+    help="Private key file (armoured) that the mock node uses to decrypt uploads, e.g. of a throwaway key pair whose public key stands in for the Edgecase public key. By default, uploads are stored without being decrypted.",
+  )
+
+  parser.add_argument(
+    '--rounds', type=int,
+    help="Number of upload/list/delete rounds per client, used by the 'loadTest' task (default: '%(default)s').",
+    default=50,
+  )
+
+  parser.add_argument(
+    '--payloadSize', dest='payload_size', type=int,
+    help="Size in bytes of each draft uploaded by the 'loadTest' task (default: '%(default)s').",
+    default=10 * 1024,
+  )
+
+  parser.add_argument(
+    '--benchmark',
+    help="Name of benchmark to run, used by the 'benchmark' task (default: '%(default)s').",
+    default='startup',
+  )
+
+  parser.add_argument(
+    '--manifest', dest='manifest_file',
+    help="Path to the manifest of uploaded drafts, used by the 'syncDrafts' task (default: '%(default)s').",
+    default='.edgecase_manifest.json',
+  )
+
+  parser.add_argument(
+    '--delete',
+    action='store_true',
+    help="In the 'syncDrafts' task, delete drafts on the node that don't exist locally.",
+  )
+
+  parser.add_argument(
+    '--gpgPool', dest='gpg_pool',
+    action='store_true',
+    help="Wrap drafts using a pool of warm GPG keyrings (one per worker, at most), so that keys are imported once per keyring rather than once per draft.",
+  )
+
+  parser.add_argument(
+    '--stream', dest='stream_uploads',
+    action='store_true',
+    help="Wrap each draft to a temporary file and upload it as a stream, so that wrapping and uploading don't hold the draft in memory. Implies --gpgPool.",
+  )
+
+  parser.add_argument(
+    '--binary', dest='binary_uploads',
+    action='store_true',
+    help="Upload drafts as binary GPG output rather than ASCII armour (about 25%% fewer bytes). Falls back to armour for a node that rejects binary uploads.",
+  )
+
+  parser.add_argument(
+    '--cacheDir', dest='cache_dir',
+    help="Directory for local caches, e.g. of article verification results (default: '%(default)s').",
+    default='.edgecase_cache',
+  )
+
+  parser.add_argument(
+    '--assetDir', dest='asset_dir',
+    help="Directory that contains the assets that an article links to (default: the article's directory).",
+    default=None,
+  )
+
+  parser.add_argument(
+    '--assets', dest='upload_assets',
+    action='store_true',
+    help="Used by the 'uploadDraft' task: upload the draft's assets before the draft.",
+  )
+
+  parser.add_argument(
+    '--fresh',
+    action='store_true',
+    help="Used by the 'listDrafts' task: ignore the cached draft list and fetch a new one from the node.",
+  )
+
+  parser.add_argument(
+    '--offset', type=int,
+    help="Used by the 'listDrafts' task: skip this many drafts (default: '%(default)s').",
+    default=0,
+  )
+
+  parser.add_argument(
+    '--limit', type=int,
+    help="Used by the 'listDrafts' task: list at most this many drafts (default: all).",
+    default=None,
+  )
+
+  parser.add_argument(
+    '--pageSize', dest='page_size', type=int,
+    help="Used by the 'listDrafts' task: fetch the list from the node in pages of this many drafts (default: in one request).",
+    default=None,
+  )
+
+  parser.add_argument(
+    '--jsonLines', dest='json_lines',
+    action='store_true',
+    help="Used by the 'listDrafts' task: print each draft as a line of JSON.",
+  )
+
+  parser.add_argument(
+    '--debounce', type=float,
+    help="Used by the 'watchDrafts' task: upload a draft once it has been unchanged for this many seconds (default: '%(default)s').",
+    default=0.2,
+  )
+
+  parser.add_argument(
+    '--poll',
+    action='store_true',
+    help="Used by the 'watchDrafts' task: poll for changes instead of using inotify.",
+  )
+
+  parser.add_argument(
+    '--noCache', dest='no_cache',
+    action='store_true',
+    help="Don't use or update the local caches.",
+  )
+
   parser.add_argument(
     '-l', '--logLevel', type=str, dest='log_level',
     choices=['debug', 'info', 'warning', 'error'],
@@ -145,6 +439,18 @@ def main():
     default='error',
   )
 
+  parser.add_argument(
+    '--viaDaemon', dest='via_daemon',
+    action='store_true',
+    help="Send the task to a running daemon (see the 'daemon' task), and print its output.",
+  )
+
+  parser.add_argument(
+    '--socket',
+    help="Path of the daemon's Unix domain socket (default: '%(default)s').",
+    default=default_socket_path,
+  )
+
   parser.add_argument(
     '-d', '--debug',
     action='store_true',
@@ -157,10 +463,24 @@ def main():
     help="Choose whether to prepend a timestamp to each log line.",
   )
 
-  a = parser.parse_args()
+  a = parser.parse_args(argv)
+
+  if a.via_daemon:
+    forward_to_daemon(sys.argv[1:] if argv is None else argv, a.socket)
+    return
 
 
   # Check and analyse arguments
+  tasks = list(task_requirements.keys())
+  if a.task not in tasks:
+    msg = "Unrecognised task: {}".format(a.task)
+    msg += "\nTask list: {}".format(tasks)
+    stop(msg)
+
+  if daemon_clients is not None and a.task in daemon_excluded_tasks:
+    msg = "The '{}' task can't be run through the daemon.".format(a.task)
+    raise ValueError(msg)
+
   if a.task == 'uploadDraft':
     if not a.article_file:
       msg = "To use the 'uploadDraft' task, need to specify the path to the articleFile."
@@ -171,7 +491,7 @@ def main():
       msg = "To use the 'deleteDraft' task, need to specify the name of the draft."
       raise ValueError(msg)
 
-  if a.task in 'uploadDraft signDraft'.split():
+  if a.task in 'uploadDraft uploadAssets signDraft'.split():
     if not isfile(a.article_file):
       msg = "File not found at path: {}".format(a.article_file)
       raise FileNotFoundError(msg)
@@ -182,55 +502,181 @@ def main():
       msg = "Directory not found at privateKeyDir {}".format(repr(a.private_key_dir))
       raise FileNotFoundError(msg)
 
-  if a.task == 'signDraft':
+  if a.task in 'uploadDrafts signDrafts syncDrafts'.split():
+    a.article_files = edgecase_client.code.client.find_article_files(a.articles)
+    if not a.article_files:
+      msg = "No article files found at: {}".format(a.articles)
+      raise FileNotFoundError(msg)
+    if a.workers < 1:
+      msg = "workers must be at least 1, not {}.".format(a.workers)
+      raise ValueError(msg)
+    if not isdir(a.private_key_dir):
+      msg = "Directory not found at privateKeyDir {}".format(repr(a.private_key_dir))
+      raise FileNotFoundError(msg)
+
+  if a.task == 'signDrafts':
+    if not isdir(a.public_key_dir):
+      msg = "Directory not found at publicKeyDir {}".format(repr(a.public_key_dir))
+      raise FileNotFoundError(msg)
+
+  if a.task in 'auditFileNames verifyArchive watchDrafts'.split():
+    if not isdir(a.articles):
+      msg = "Directory not found at articles {}".format(repr(a.articles))
+      raise FileNotFoundError(msg)
+
+  if a.task == 'verifyArchive':
+    if not isdir(a.public_key_dir):
+      msg = "Directory not found at publicKeyDir {}".format(repr(a.public_key_dir))
+      raise FileNotFoundError(msg)
+
+  if a.task in 'signDraft signDrafts'.split():
     if not isdir(a.output_dir):
       os.makedirs(a.output_dir)
 
 
-  # Derive new arguments
-  edgecase_public_key_file = join(a.public_key_dir, edgecase_public_key_file_name)
-  if not isfile(edgecase_public_key_file):
-    msg = "Could not find Edgecase public key file at path: {}".format(edgecase_public_key_file)
-    raise FileNotFoundError(msg)
-  a.edgecase_public_key = open(edgecase_public_key_file).read()
-
-  # Load config, validate it, and add its values to the argument namespace.
-  config_file = 'config.ini'
-  if not isfile(config_file):
-    msg = "File not found at: {}".format(config_file)
-    raise FileNotFoundError(msg)
-  config = configparser.ConfigParser()
-  config.read_file(open(config_file))
-  # Check for expected config.
-  expected_sections = 'user'.split()
-  for section in expected_sections:
-    if not config.has_section(section):
-      raise KeyError
-  user_section = config['user']
-  expected_user_keys = 'author_name author_key_name long_user_id'.split()
-  for user_key in expected_user_keys:
-    if not config.has_option(section='user', option=user_key):
-      raise KeyError
-    value = config.get('user', user_key)
-    setattr(a, user_key, value)
-
   # Setup
+  requirements = task_requirements[a.task].split()
   setup(
     log_level = a.log_level,
     debug = a.debug,
     log_timestamp = a.log_timestamp,
+    load_article = 'article' in requirements,
   )
+  import_task_modules(a.task)
+
+  # Create the client, if this task needs one. It loads and validates config.ini, and reads key files on first use.
+  a.client = None
+  if 'config' in requirements:
+    a.client = get_client(a)
 
   # Run top-level function (i.e. the appropriate task).
-  tasks = """
-hello
-uploadDraft listDrafts deleteDraft signDraft
-""".split()
-  if a.task not in tasks:
-    msg = "Unrecognised task: {}".format(a.task)
-    msg += "\nTask list: {}".format(tasks)
-    stop(msg)
   globals()[a.task](a)  # run task.
+  if a.client is not None:
+    if a.latencies:
+      rows = a.client.latency_report()
+      if rows:
+        print(edgecase_client.util.misc.format_table(rows))
+      rows = a.client.node_report()
+      if len(rows) > 1:
+        print(edgecase_client.util.misc.format_table(rows))
+    # In daemon mode, the client is kept for the next request.
+    if daemon_clients is None:
+      a.client.close()
+
+
+
+
+def get_client(a):
+  kwargs = dict(
+    config_file = 'config.ini',
+    public_key_dir = a.public_key_dir,
+    private_key_dir = a.private_key_dir,
+    domain = domain,
+    domains = tuple(edgecase_client.code.config.parse_domains(a.domain)) if a.domain else None,
+    fan_out = a.fan_out,
+    timeout = ttw,
+    concurrency = a.workers,
+    retries = a.retries,
+    hedge_after = a.hedge_after,
+    cache_dir = None if a.no_cache else a.cache_dir,
+    use_gpg_pool = a.gpg_pool,
+    stream_uploads = a.stream_uploads,
+    binary_uploads = a.binary_uploads,
+  )
+  if daemon_clients is None:
+    return edgecase_client.Client(**kwargs)
+  # Reuse a client with the same settings, in the same directory, as long as config.ini hasn't changed.
+  config_mtime = os.stat(kwargs['config_file']).st_mtime_ns if isfile(kwargs['config_file']) else None
+  key = (os.getcwd(), config_mtime, tuple(sorted(kwargs.items())))
+  if key not in daemon_clients:
+    # Close the clients that this one replaces (e.g. because config.ini has changed), so that their GPG keyrings are removed.
+    for old_key in list(daemon_clients.keys()):
+      if old_key[0] == key[0] and old_key[2] == key[2]:
+        daemon_clients.pop(old_key).close()
+    daemon_clients[key] = edgecase_client.Client(**kwargs)
+  return daemon_clients[key]
+
+
+
+
+def handle_daemon_request(request):
+  # Run a forwarded task in this process, and return its output and exit code.
+  import io
+  import contextlib
+  import traceback
+  with daemon_lock:
+    output = io.StringIO()
+    exit_code = 0
+    old_cwd = os.getcwd()
+    try:
+      os.chdir(request['cwd'])
+      with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        try:
+          main(request['argv'])
+        except SystemExit as e:
+          if isinstance(e.code, int):
+            exit_code = e.code
+          elif e.code is not None:
+            print(e.code)
+            exit_code = 1
+        except Exception:
+          traceback.print_exc(file=output)
+          exit_code = 1
+    finally:
+      os.chdir(old_cwd)
+  return {'output': output.getvalue(), 'exit_code': exit_code}
+
+
+
+
+def import_task_modules(task):
+  # Import the heavy modules that a task needs. Nothing else imports them at module load.
+  requirements = task_requirements[task].split()
+  if 'api' in requirements:
+    import requests
+  if 'article' in requirements:
+    edgecase_client.code.client.load_edgecase_article()
+
+
+
+
+def import_lazy_module(a, name):
+  # Import a module that edgecase_client.code doesn't import at load time, and configure its logger.
+  module = importlib.import_module('edgecase_client.code.' + name)
+  module.setup(
+    log_level = a.log_level,
+    debug = a.debug,
+    log_timestamp = a.log_timestamp,
+  )
+  return module
+
+
+
+
+def daemon(a):
+  # Serve tasks forwarded by 'cli.py --viaDaemon ...' until stopped.
+  global daemon_clients
+  daemon_clients = {}
+  # Import the heavy modules now, so that the first forwarded task doesn't wait for them.
+  import requests
+  try:
+    edgecase_client.code.client.load_edgecase_article()
+  except Exception as e:
+    log("Could not preload edgecase_article: {}".format(e))
+  print("Daemon listening on {}. Stop it with --task stopDaemon, or Ctrl-C.".format(a.socket), flush=True)
+  try:
+    import_lazy_module(a, 'daemon').serve(a.socket, handle_daemon_request)
+  finally:
+    for client in daemon_clients.values():
+      client.close()
+    daemon_clients = None
+
+
+
+
+def stopDaemon(a):
+  import_lazy_module(a, 'daemon').send_request(a.socket, {'command': 'stop'})
+  print("Daemon stopped.")
 
 
 
@@ -246,60 +692,151 @@ def hello(a):
 
 
 
+def benchmark(a):
+  cli_file = os.path.abspath(__file__)
+  kwargs = {}
+  if a.benchmark == 'startup':
+    kwargs = {'cli_file': cli_file, 'tasks': list(task_requirements.keys())}
+  if a.benchmark == 'uploadMemory' and a.article_file:
+    kwargs = {'article_file': a.article_file}
+  report = import_lazy_module(a, 'benchmark').run(a.benchmark, **kwargs)
+  print(report)
+
+
+
+
+def mockNode(a):
+  # Run a local stand-in Edgecase node until interrupted. Other tasks can use it with e.g. --domain 127.0.0.1:8765.
+  mock_node = import_lazy_module(a, 'mock_node')
+  unwrap_key = None
+  if a.unwrap_key_file:
+    with open(a.unwrap_key_file) as f:
+      unwrap_key = f.read()
+  node = mock_node.MockNode(
+    port = a.port,
+    latency = a.latency,
+    error_rate = a.error_rate,
+    unwrap_key = unwrap_key,
+  )
+  node.start()
+  print("Mock node listening on {}. Press Ctrl-C to stop.".format(node.domain))
+  try:
+    while True:
+      time.sleep(3600)
+  except KeyboardInterrupt:
+    pass
+  node.stop()
+
+
+
+
+def loadTest(a):
+  # Run --workers concurrent clients against the node at --domain, or (by default) against a mock node in this process.
+  import_lazy_module(a, 'mock_node')
+  load_test = import_lazy_module(a, 'load_test')
+  start = time.time()
+  rows = load_test.load_test(
+    domain = a.domain,
+    clients = a.workers,
+    rounds = a.rounds,
+    payload_size = a.payload_size,
+    timeout = ttw,
+    latency = a.latency,
+    error_rate = a.error_rate,
+  )
+  elapsed = time.time() - start
+  print(edgecase_client.util.misc.format_table(rows))
+  print("{c} clients, {r} rounds each, in {e:.2f} seconds.".format(c=a.workers, r=a.rounds, e=elapsed))
+
+
+
+
 def uploadDraft(a):
-  a.draft_article = edgecase_article.verify(
-    article_file = a.article_file,
-    article_type = 'article',
-    verify_file_name = False,
-    verify_signature = False,
-    verify_content = True,
-    public_key_dir = None,
-    #verify_assets = True,
-    verify_assets = False, # use when testing.
-  )
-  log("Draft article format is valid.")
-  if a.draft_article.author_name != a.author_key_name:
-    msg = "Author key name is '{k}', but author name found in draft is '{d}'."
-    msg = msg.format(d=a.draft_article.author_name, k=a.author_key_name)
-    raise ValueError(msg)
-  private_key_file = join(a.private_key_dir, a.author_key_name + '_private_key.txt')
-  if not isfile(private_key_file):
-    msg = "Author private key file not found at path: {}".format(private_key_file)
-    raise FileNotFoundError(msg)
-  author_private_key = open(private_key_file).read()
-  data = a.draft_article.data
-  wrapped_data = gpg.wrap_data(author_private_key, a.edgecase_public_key, data)
-  # Send request
-  uri = '{d}/api/v1/authors/{a}/upload/draft'.format(d=domain, a=a.author_name)
-  uri = 'http://' + uri
-  cookies = {'edgecase_long_user_id': a.long_user_id}
-  files = {'data': wrapped_data}
-  response = requests.post(uri, timeout=ttw, cookies=cookies, files=files)
+  if a.upload_assets:
+    rows = uploadAssets(a)
+    if any(r['status'] != 'ok' for r in rows):
+      print("Not all assets were uploaded, so the draft was not uploaded.")
+      return
+  response = a.client.upload_draft(a.article_file)
   result = response.text.strip()
   print(result)
 
 
 
 
+def uploadAssets(a):
+  # Upload the assets that a draft links to. Assets that the node already has are skipped.
+  start = time.time()
+  rows = a.client.upload_assets(a.article_file, a.asset_dir)
+  elapsed = time.time() - start
+  table = [{
+    'asset': r['file_name'],
+    'action': r['action'],
+    'status': r['status'],
+    'bytes': r['size'],
+    'seconds': '{:.2f}'.format(r['duration']),
+    'result': r['result'],
+  } for r in rows]
+  if table:
+    print(edgecase_client.util.misc.format_table(table))
+  n_ok = len([r for r in rows if r['status'] == 'ok'])
+  n_skipped = len([r for r in rows if r['action'] == 'skip'])
+  msg = "{n}/{t} assets on node ({s} already there) after {e:.2f} seconds."
+  print(msg.format(n=n_ok, t=len(rows), s=n_skipped, e=elapsed))
+  return rows
+
+
+
+
+def uploadDrafts(a):
+  # Upload every draft found at a.articles.
+  start = time.time()
+  rows = a.client.upload_drafts(a.article_files)
+  elapsed = time.time() - start
+  # Print per-draft result table, in input order.
+  table = [{
+    'draft': basename(r['article_file']),
+    'status': r['status'],
+    'bytes': r['size'],
+    'seconds': '{:.2f}'.format(r['duration']),
+    'result': r['result'],
+  } for r in rows]
+  print(edgecase_client.util.misc.format_table(table))
+  # Print aggregate throughput.
+  n_ok = len([r for r in rows if r['status'] == 'ok'])
+  total_bytes = sum(r['size'] for r in rows)
+  elapsed = max(elapsed, 1e-9)
+  msg = "Uploaded {n}/{t} drafts ({b} bytes) in {e:.2f} seconds: {d:.2f} drafts/s, {bs:.0f} bytes/s."
+  print(msg.format(
+    n=n_ok, t=len(rows), b=total_bytes, e=elapsed,
+    d=n_ok / elapsed, bs=total_bytes / elapsed,
+  ))
+  # Print per-stage utilisation. The busiest stage is the bottleneck.
+  print(edgecase_client.util.misc.format_table(a.client.upload_report))
+
+
+
+
 def listDrafts(a):
-  uri = '{d}/api/v1/authors/{a}/drafts'.format(d=domain, a=a.author_name)
-  uri = 'http://' + uri
-  cookies = None
-  response = requests.get(uri, timeout=ttw, cookies=cookies)
-  result = response.json()
-  drafts = result['data']
-  draft_names = [x['name'] for x in drafts]
-  for draft_name in draft_names:
-    print('- ' + draft_name)
+  # Each draft is printed as soon as it has been parsed from the node's response.
+  drafts = a.client.iter_drafts(
+    fresh = a.fresh,
+    offset = a.offset,
+    limit = a.limit,
+    page_size = a.page_size,
+  )
+  for draft in drafts:
+    if a.json_lines:
+      line = json.dumps(draft, sort_keys=True)
+    else:
+      line = '- ' + draft['name']
+    print(line, flush=True)
 
 
 
 
 def deleteDraft(a):
-  uri = '{d}/api/v1/authors/{a}/delete/draft/'.format(d=domain, a=a.author_name)
-  uri = 'http://' + uri + a.name
-  cookies = {'edgecase_long_user_id': a.long_user_id}
-  response = requests.get(uri, timeout=ttw, cookies=cookies)
+  response = a.client.delete_draft(a.name)
   result = response.text.strip()
   print(result)
 
@@ -307,27 +844,123 @@ def deleteDraft(a):
 
 
 def signDraft(a):
-  a.draft_article = edgecase_article.verify(
-    article_file = a.article_file,
-    article_type = 'article',
-    verify_file_name = False,
-    verify_signature = False,
-    verify_content = True,
-    public_key_dir = None,
-    #verify_assets = True,
-    verify_assets = False, # use when testing.
-  )
-  log("Draft article format is valid.")
-  #print(a.draft_article.uri_title)
-  signed_article = edgecase_article.edgecase_article.code.sign.sign(
-    article_file = a.article_file,
-    public_key_dir = a.public_key_dir,
-    private_key_dir = a.private_key_dir,
+  a.client.sign_draft(a.article_file, a.output_dir)
+
+
+
+
+def signDrafts(a):
+  # Sign every draft found at a.articles, across a.workers processes.
+  start = time.time()
+  rows = a.client.sign_drafts(a.article_files, a.output_dir, workers=a.workers)
+  elapsed = time.time() - start
+  # Print per-draft result table, in input order.
+  table = [{
+    'draft': basename(r['article_file']),
+    'status': r['status'],
+    'seconds': '{:.2f}'.format(r['duration']),
+    'result': r['result'],
+  } for r in rows]
+  print(edgecase_client.util.misc.format_table(table))
+  n_ok = len([r for r in rows if r['status'] == 'ok'])
+  elapsed = max(elapsed, 1e-9)
+  msg = "Signed {n}/{t} drafts in {e:.2f} seconds: {d:.2f} drafts/s."
+  print(msg.format(n=n_ok, t=len(rows), e=elapsed, d=n_ok / elapsed))
+
+
+
+
+def syncDrafts(a):
+  # Upload only the drafts at a.articles that are new or have changed.
+  rows = a.client.sync_drafts(a.article_files, a.manifest_file, delete=a.delete)
+  table = [{
+    'draft': r['name'] or basename(r['article_file']),
+    'action': r['action'],
+    'status': r['status'],
+    'result': r['result'],
+  } for r in rows]
+  print(edgecase_client.util.misc.format_table(table))
+  counts = {}
+  for r in rows:
+    if r['status'] == 'ok':
+      counts[r['action']] = counts.get(r['action'], 0) + 1
+  msg = "Uploaded {u}, skipped {s}, deleted {d}. Failures: {f}."
+  print(msg.format(
+    u=counts.get('upload', 0), s=counts.get('skip', 0), d=counts.get('delete', 0),
+    f=len([r for r in rows if r['status'] != 'ok']),
+  ))
+
+
+
+
+def watchDrafts(a):
+  # Upload each draft in the directory a.articles whenever it is saved with new content. Runs until interrupted.
+  print("Watching {} for changes. Press Ctrl-C to stop.".format(a.articles), flush=True)
+
+  def report(r):
+    msg = "{t} {f}: {s} in {d:.2f} seconds. {r}"
+    print(msg.format(
+      t=time.strftime('%H:%M:%S'), f=basename(r['article_file']), s=r['status'],
+      d=r['duration'], r=r['result'],
+    ), flush=True)
+
+  try:
+    edgecase_client.code.watch.watch_drafts(
+      a.client, a.articles,
+      callback = report,
+      debounce = a.debounce,
+      use_inotify = not a.poll,
+    )
+  except KeyboardInterrupt:
+    pass
+
+
+
+
+def auditFileNames(a):
+  # Check every file name in the archive directory a.articles against the header within the file.
+  start = time.time()
+  file_paths = edgecase_client.code.audit.find_archive_files(a.articles)
+  mismatches, count = edgecase_client.code.audit.audit_file_names(file_paths, workers=a.workers)
+  elapsed = max(time.time() - start, 1e-9)
+  for file_path, problems in mismatches:
+    print(file_path)
+    for problem in problems:
+      print('- ' + problem)
+  msg = "Audited {n} file names in {e:.2f} seconds ({r:.0f} files/s). Mismatches: {m}."
+  print(msg.format(n=count, e=elapsed, r=count / elapsed, m=len(mismatches)))
+
+
+
+
+def verifyArchive(a):
+  # Verify the content, file name and signature of every article in the archive directory a.articles.
+  start = time.time()
+  file_paths = edgecase_client.code.audit.find_archive_files(a.articles)
+
+  def report(file_path, error, duration):
+    status = 'ok' if error is None else 'FAIL'
+    line = '{s:<4}  {d:7.3f}s  {f}'.format(s=status, d=duration, f=file_path)
+    if error is not None:
+      line += '\n      ' + error
+    print(line, flush=True)
+
+  failures, durations = edgecase_client.code.audit.verify_archive(
+    file_paths, a.article_type, a.public_key_dir,
+    workers = a.workers,
+    callback = report,
   )
-  output_file_name = signed_article.construct_file_name()
-  output_file = join(a.output_dir, output_file_name)
-  with open(output_file, 'w') as f:
-    f.write(signed_article.data + '\n')
+  elapsed = max(time.time() - start, 1e-9)
+  stats = edgecase_client.util.stats.summarise_latencies(durations)
+  print()
+  msg = "Verified {n} files in {e:.2f} seconds ({r:.2f} files/s)."
+  print(msg.format(n=stats['count'], e=elapsed, r=stats['count'] / elapsed))
+  if stats['count'] > 0:
+    msg = "Per-file latency: p50 {p50:.3f}s, p99 {p99:.3f}s, max {max:.3f}s."
+    print(msg.format(**stats))
+  print("Failures: {}".format(len(failures)))
+  for file_path, error in sorted(failures):
+    print('- {}: {}'.format(file_path, error))
 
 
 
@@ -5,15 +5,17 @@ import logging
 
 
 # Relative imports
-#from . import code
+from . import code
 from . import util
-from . import submodules
+# Note: submodules is imported on first use (see code.client.load_edgecase_article), because it is slow to import.
 
 
 
 
 # Expose shortcuts to the outside.
 #application = code.application.application
+APIClient = code.api.APIClient
+Client = code.client.Client
 
 
 
@@ -45,13 +47,13 @@ def setup(
   )
   deb('Setup complete.')
   # Configure modules further down in this package.
-  return
   code.setup(
     log_level = log_level,
     debug = debug,
     log_timestamp = log_timestamp,
     log_file = log_file,
   )
+  return
   submodules.setup(
     log_level = log_level,
     debug = debug,
@@ -0,0 +1,73 @@
+# Imports
+import logging
+
+
+
+
+# Relative imports
+from .. import util
+from . import api
+from . import config
+from . import node_pool
+from . import verify_cache
+from . import list_cache
+from . import manifest
+from . import gpg_pool
+from . import pipeline
+from . import client
+from . import audit
+from . import watch
+from . import assets
+# Note: benchmark, daemon, mock_node and load_test are not imported here, because they import modules (e.g. http.server, socketserver, subprocess) that most tasks don't need. Import them on first use, and call their setup functions.
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+  # Configure modules further down in this package.
+  modules = [
+    api,
+    config,
+    node_pool,
+    verify_cache,
+    list_cache,
+    manifest,
+    gpg_pool,
+    pipeline,
+    client,
+    audit,
+    watch,
+    assets,
+  ]
+  for module in modules:
+    module.setup(
+      log_level = log_level,
+      debug = debug,
+      log_timestamp = log_timestamp,
+      log_file = log_file,
+    )
@@ -0,0 +1,586 @@
+# Imports
+import os
+import time
+import codecs
+import random
+import logging
+import functools
+import threading
+
+
+
+
+# Relative imports
+from .. import util
+from . import node_pool
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Settings
+default_domain = 'edgecase.net'
+default_timeout = 3  # seconds
+default_concurrency = 8
+# An upload's read timeout is extended by the time that its payload would take to send at this rate.
+default_min_upload_rate = 256 * 1024  # bytes per second
+default_retries = 3
+retry_base_delay = 0.1  # seconds
+retry_max_delay = 2  # seconds
+# Responses with these status codes are treated as transient, and idempotent requests that receive them are retried.
+retry_status_codes = [429, 502, 503, 504]
+stream_chunk_size = 16 * 1024  # bytes
+# A binary upload carries this header. A node that accepts it sends the header back, with the same value. A node that rejects it with 415, or with 400 or 422 and a message that mentions the wrap format, is sent armoured uploads instead.
+wrap_format_header = 'X-Edgecase-Wrap-Format'
+binary_rejected_status_codes = [400, 415, 422]
+binary_rejected_words = ['binary', 'wrap format', wrap_format_header.lower()]
+# A node that applied the offset and limit query parameters to a draft listing says so with this response header.
+paging_header = 'X-Edgecase-Paging'
+upload_draft_path = '/api/v1/authors/{a}/upload/draft'
+list_drafts_path = '/api/v1/authors/{a}/drafts'
+delete_draft_path = '/api/v1/authors/{a}/delete/draft/{n}'
+upload_asset_path = '/api/v1/authors/{a}/upload/asset'
+asset_path = '/api/v1/authors/{a}/assets/{h}'
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def slice_drafts(drafts, offset, limit=None):
+  # Skip offset drafts, and then yield up to limit drafts (or all the rest, if limit is None). drafts is closed afterwards.
+  try:
+    for i, draft in enumerate(drafts):
+      if limit is not None and i >= offset + limit:
+        break
+      if i >= offset:
+        yield draft
+  finally:
+    drafts.close()
+
+
+
+
+def close_response(future):
+  # Done-callback for a request future whose response won't be used.
+  if not future.cancelled() and future.exception() is None:
+    future.result().close()
+
+
+
+
+class APIClient:
+
+
+  # Notes:
+  # - The requests library is synchronous, so each request runs on a thread pool and is awaited from the event loop.
+  # - One requests.Session (with a connection pool sized to the concurrency limit) is shared by all requests.
+  # - Any number of requests can be in flight as coroutines. A semaphore limits how many are sent to the node at once.
+  # - asyncio and requests are imported on first use rather than at module load, so that tasks that don't talk to the node start faster.
+  # - The connect timeout is the base timeout. The read timeout is the base timeout plus the time that the payload would take to send at min_upload_rate, so that large uploads aren't cut off.
+  # - Idempotent requests (reads and deletes) are retried after a connection error, a timeout or a transient status code (one of retry_status_codes, or any 5xx), up to retries times. The delay before each retry is random, between 0 and an exponentially growing limit ("full jitter"), so that many clients don't retry in step.
+  # - Uploads are not retried, because a retried upload might be stored twice.
+  # - Requests are spread over a pool of nodes (see node_pool.py). Each attempt goes to the fastest healthy node. A connection error, timeout or 5xx response marks the node as down for a while.
+  # - Failover: a request that can't reach its node, or an idempotent request that gets a 5xx response, is sent at once to the next healthy node that it hasn't tried, without counting as a retry. This applies to uploads too, after a connection error (the upload didn't reach the node). After a timeout, only idempotent requests fail over.
+  # - A streamed body is passed as a function that returns a fresh body, so that it can be sent again to another node.
+  # - If fan_out is more than 1, a list request is sent to that many of the best nodes at once, and whichever successful response arrives first is used. An error response is only used if every request fails.
+  # - A draft can be uploaded as binary OpenPGP data instead of ASCII armour, which is about 25% smaller. This is negotiated per node (see upload_negotiated): the first binary upload to a node is sent with the wrap_format_header, and the node must confirm it by sending the header back. If the node rejects the format, or doesn't confirm it, the draft is armoured (without calling gpg again) and sent again, and that node is sent armoured drafts from then on.
+  # - If hedge_after is set, a list request that hasn't returned after hedge_after seconds is sent again (to the next best node, if there is one), and whichever response arrives first is used.
+  # - The latency of each attempt is recorded in a histogram per operation (see latency_report).
+
+
+  def __init__(
+      self,
+      domain = default_domain,
+      timeout = default_timeout,
+      concurrency = default_concurrency,
+      retries = default_retries,
+      hedge_after = None,
+      min_upload_rate = default_min_upload_rate,
+      domains = None,
+      fan_out = 1,
+      ):
+    # domains: a list of node domains. If given, it is used instead of domain.
+    if not domains:
+      domains = [domain]
+    for x in domains:
+      util.validate.validate_string(x, 'domain', 'APIClient.__init__')
+    util.validate.validate_positive_integer(concurrency, 'concurrency', 'APIClient.__init__')
+    if concurrency == 0:
+      raise ValueError('concurrency must be at least 1.')
+    util.validate.validate_positive_integer(fan_out, 'fan_out', 'APIClient.__init__')
+    self.nodes = node_pool.NodePool(domains)
+    self.domain = domains[0]
+    self.fan_out = max(1, fan_out)
+    self.timeout = timeout
+    self.concurrency = concurrency
+    self.retries = retries
+    self.hedge_after = hedge_after
+    self.min_upload_rate = min_upload_rate
+    self.latencies = {}
+    self.retry_counts = {}
+    self.failover_counts = {}
+    import asyncio
+    import requests
+    import concurrent.futures
+    self.session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+      pool_connections = 1,
+      pool_maxsize = concurrency,
+    )
+    self.session.mount('http://', adapter)
+    self.session.mount('https://', adapter)
+    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+    self.loop = asyncio.new_event_loop()
+    # The semaphore is created on first use, so that it belongs to the loop that runs the requests.
+    self.semaphore = None
+    self.loop_thread = None
+
+
+  def build_path(self, path, **kwargs):
+    # The node is chosen for each attempt, in request().
+    return path.format(**kwargs)
+
+
+  def timeout_for(self, payload_size=0):
+    # Returns a (connect, read) timeout tuple for a request that sends payload_size bytes.
+    read_timeout = self.timeout + payload_size / self.min_upload_rate
+    return (self.timeout, read_timeout)
+
+
+  def record_latency(self, operation, duration):
+    if operation not in self.latencies:
+      self.latencies[operation] = util.stats.LatencyHistogram()
+    self.latencies[operation].record(duration)
+
+
+  def latency_report(self):
+    # Returns a list of rows (dicts), one per operation, with the latency percentiles in milliseconds and the number of retries and failovers.
+    rows = []
+    for operation in sorted(self.latencies.keys()):
+      summary = self.latencies[operation].summary()
+      row = {'operation': operation, 'requests': summary['count']}
+      for name in 'p50 p90 p99 max'.split():
+        row[name + '_ms'] = '{:.1f}'.format(summary[name] * 1000)
+      row['retries'] = self.retry_counts.get(operation, 0)
+      row['failovers'] = self.failover_counts.get(operation, 0)
+      rows.append(row)
+    return rows
+
+
+  def node_report(self):
+    # Returns a list of rows (dicts), one per node (see NodePool.report).
+    return self.nodes.report()
+
+
+  async def request(self, method, path, operation='request', idempotent=False, payload_size=0, node=None, **kwargs):
+    # The first attempt goes to node, if given, and otherwise to the best node in the pool.
+    # If data is a function, it is called before each attempt to get a fresh body.
+    import asyncio
+    import requests
+    if self.semaphore is None:
+      self.semaphore = asyncio.Semaphore(self.concurrency)
+    kwargs.setdefault('timeout', self.timeout_for(payload_size))
+    data = kwargs.pop('data', None)
+    retries = self.retries if idempotent else 0
+    attempt = 0
+    tried = []
+    while True:
+      if node is None:
+        node = self.nodes.choose(exclude=tried)
+      tried.append(node)
+      uri = node.base_uri + path
+      body = data() if callable(data) else data
+      send = functools.partial(self.session.request, method, uri, data=body, **kwargs)
+      error = None
+      async with self.semaphore:
+        deb("{} {}".format(method, uri))
+        start = time.perf_counter()
+        future = self.executor.submit(send)
+        try:
+          response = await asyncio.wrap_future(future, loop=self.loop)
+        except (requests.ConnectionError, requests.Timeout) as e:
+          error = e
+        except asyncio.CancelledError:
+          # E.g. a hedged request that lost the race. Its thread carries on, so close its response when it arrives, to release the connection.
+          future.add_done_callback(close_response)
+          raise
+        duration = time.perf_counter() - start
+      self.record_latency(operation, duration)
+      if error is None:
+        # So that the caller can tell which node answered.
+        response.node = node
+      if error is not None:
+        deb("{} {} -> {}".format(method, uri, type(error).__name__))
+        self.nodes.record_failure(node)
+        # A connection error (including a connect timeout) means that the request didn't reach the node.
+        can_fail_over = idempotent or isinstance(error, requests.ConnectionError)
+      else:
+        deb("{} {} -> {}".format(method, uri, response.status_code))
+        if response.status_code >= 500:
+          self.nodes.record_failure(node)
+        else:
+          self.nodes.record_success(node, duration)
+        # For an idempotent request, any 5xx response is treated as transient.
+        transient = response.status_code in retry_status_codes or (idempotent and response.status_code >= 500)
+        if not transient:
+          return response
+        can_fail_over = idempotent
+      untried = [x for x in self.nodes.ordered(exclude=tried) if x not in tried and x.is_healthy()]
+      if error is None and ((can_fail_over and untried) or attempt < retries):
+        # This response won't be used.
+        response.close()
+      if can_fail_over and untried:
+        node = untried[0]
+        self.failover_counts[operation] = self.failover_counts.get(operation, 0) + 1
+        log("Failing over {o} from {a} to {b}.".format(o=operation, a=tried[-1].domain, b=node.domain))
+        continue
+      if attempt < retries:
+        attempt += 1
+        delay = random.uniform(0, min(retry_max_delay, retry_base_delay * 2 ** attempt))
+        self.retry_counts[operation] = self.retry_counts.get(operation, 0) + 1
+        deb("Retry {n} of {o} in {d:.3f} seconds.".format(n=attempt, o=operation, d=delay))
+        await asyncio.sleep(delay)
+        node = None
+        continue
+      if error is not None:
+        raise error
+      return response
+
+
+  async def hedged_request(self, method, path, operation='request', **kwargs):
+    # Send an idempotent request to the fan_out best nodes at once. If hedge_after is set and no response has arrived after hedge_after seconds, send it once more, to the next best node. The first successful response (i.e. one with response.ok) is used. An error response doesn't win: the other requests are still waited for.
+    import asyncio
+    nodes = self.nodes.ordered()
+    n = min(self.fan_out, len(nodes))
+    if n == 1 and self.hedge_after is None:
+      return await self.request(method, path, operation=operation, idempotent=True, **kwargs)
+
+    def start(node, label):
+      return self.loop.create_task(self.request(method, path, operation=label, idempotent=True, node=node, **kwargs))
+
+    tasks = [start(nodes[0], operation)]
+    tasks += [start(nodes[i], operation + ' (fan-out)') for i in range(1, n)]
+    pending = set(tasks)
+    hedged = self.hedge_after is None
+    hedge_at = self.loop.time() + (self.hedge_after or 0)
+    winner = None
+    while pending and winner is None:
+      timeout = None if hedged else max(0, hedge_at - self.loop.time())
+      done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+      for task in done:
+        if task.exception() is None and task.result().ok:
+          winner = task
+          break
+      if not done and not hedged:
+        hedged = True
+        deb("Hedging {} after {} seconds.".format(operation, self.hedge_after))
+        tasks.append(start(nodes[n % len(nodes)], operation + ' (hedge)'))
+        pending.add(tasks[-1])
+    if winner is None:
+      # All failed. Return the first request's response, or raise its error.
+      winner = tasks[0]
+    for other in pending:
+      other.cancel()
+    # Let the cancellations take effect (this doesn't wait for the cancelled requests' threads). Each cancelled request closes its response when it arrives.
+    if pending:
+      await asyncio.wait(pending)
+    # Close the responses that won't be used.
+    for task in tasks:
+      if task is not winner and not task.cancelled() and task.exception() is None:
+        task.result().close()
+    return winner.result()
+
+
+  async def upload_negotiated(self, send, payload, armor):
+    # Upload a binary payload, falling back to an armoured one if the node rejects it.
+    # send(payload, binary, node) sends the upload and returns the response. armor() returns the armoured payload.
+    # - The node is chosen here, so that its binary_uploads setting applies to the node that the upload is sent to.
+    # - A node is recorded as accepting binary uploads only once it confirms this, by sending the wrap_format_header back. A node that accepts the upload without confirming it has probably ignored the header, and stored data that it can't read, so the draft is sent again, armoured.
+    # - An error response only counts as a rejection of the format if it is a 415, or a 400 or 422 whose message mentions the format (and not e.g. an invalid draft).
+    node = self.nodes.choose()
+    if node.binary_uploads is not False:
+      response = await send(payload, True, node)
+      # After a connection error, the upload might have failed over to another node.
+      node = response.node
+      if response.ok and response.headers.get(wrap_format_header) == 'binary':
+        node.binary_uploads = True
+        return response
+      if node.binary_uploads or not (response.ok or self.rejects_binary(response)):
+        return response
+      node.binary_uploads = False
+      if response.ok:
+        log("Node {d} accepted a binary upload, but didn't confirm the format. Sending it armoured uploads instead.".format(d=node.domain))
+      else:
+        log("Node {d} rejected a binary upload (HTTP {s}). Sending it armoured uploads instead.".format(d=node.domain, s=response.status_code))
+      response.close()
+    payload = await self.loop.run_in_executor(None, armor)
+    return await send(payload, False, node)
+
+
+  def rejects_binary(self, response):
+    # Returns True if the response rejects the wrap format of a binary upload.
+    if response.status_code == 415:
+      return True
+    if response.status_code not in binary_rejected_status_codes:
+      return False
+    text = response.text.lower()
+    return any(x in text for x in binary_rejected_words)
+
+
+  async def upload_draft(self, author_name, long_user_id, wrapped_data, binary=False):
+    # wrapped_data: ASCII-armoured text, or, if binary is True, binary OpenPGP data (bytes).
+    path = self.build_path(upload_draft_path, a=author_name)
+    cookies = {'edgecase_long_user_id': long_user_id}
+
+    async def send(data, binary, node=None):
+      headers = {wrap_format_header: 'binary'} if binary else {}
+      return await self.request(
+        'POST', path, operation='upload_draft', payload_size=len(data), node=node,
+        cookies=cookies, headers=headers, files={'data': data},
+      )
+
+    if not binary:
+      return await send(wrapped_data, False)
+    armor = functools.partial(util.pgp_armor.armor, wrapped_data)
+    return await self.upload_negotiated(send, wrapped_data, armor)
+
+
+  async def upload_draft_file(self, author_name, long_user_id, wrapped_file, binary=False):
+    # Stream the wrapped draft from a file, with chunked transfer encoding, instead of holding it in memory.
+    # If binary is True, the file contains binary OpenPGP data. If it has to be armoured, the armoured copy is also streamed from a file.
+    path = self.build_path(upload_draft_path, a=author_name)
+    cookies = {'edgecase_long_user_id': long_user_id}
+
+    async def send(file_path, binary, node=None):
+      content_type, body = util.multipart.multipart_file_stream('data', file_path)
+      headers = {'Content-Type': content_type}
+      if binary:
+        headers[wrap_format_header] = 'binary'
+      return await self.request(
+        'POST', path, operation='upload_draft', payload_size=os.path.getsize(file_path), node=node,
+        cookies=cookies, headers=headers, data=body,
+      )
+
+    if not binary:
+      return await send(wrapped_file, False)
+    armored_file = wrapped_file + '.asc'
+
+    def armor():
+      util.pgp_armor.armor_file(wrapped_file, armored_file)
+      return armored_file
+
+    try:
+      return await self.upload_negotiated(send, wrapped_file, armor)
+    finally:
+      if os.path.exists(armored_file):
+        os.remove(armored_file)
+
+
+  async def list_drafts(self, author_name):
+    drafts, etag, last_modified = await self.list_drafts_conditional(author_name)
+    return drafts
+
+
+  async def list_drafts_conditional(self, author_name, etag=None, last_modified=None):
+    # If etag or last_modified (from an earlier response) is given, the request is conditional.
+    # Returns drafts, etag, last_modified. drafts is None if the node answered 304 Not Modified.
+    path = self.build_path(list_drafts_path, a=author_name)
+    headers = {}
+    if etag:
+      headers['If-None-Match'] = etag
+    if last_modified:
+      headers['If-Modified-Since'] = last_modified
+    response = await self.hedged_request('GET', path, operation='list_drafts', headers=headers)
+    if response.status_code == 304:
+      return None, etag, last_modified
+    response.raise_for_status()
+    result = response.json()
+    drafts = result['data']
+    return drafts, response.headers.get('ETag'), response.headers.get('Last-Modified')
+
+
+  async def delete_draft(self, author_name, long_user_id, name):
+    path = self.build_path(delete_draft_path, a=author_name, n=name)
+    cookies = {'edgecase_long_user_id': long_user_id}
+    # Deleting a draft that has already been deleted has no further effect, so a delete can be retried.
+    response = await self.request('GET', path, operation='delete_draft', idempotent=True, cookies=cookies)
+    return response
+
+
+  async def upload_asset_file(self, author_name, long_user_id, file_name, wrapped_file):
+    # Stream a wrapped asset from a file. file_name is the asset's own (unwrapped) file name.
+    path = self.build_path(upload_asset_path, a=author_name)
+    cookies = {'edgecase_long_user_id': long_user_id}
+    content_type, body = util.multipart.multipart_file_stream('data', wrapped_file, file_name=file_name)
+    headers = {'Content-Type': content_type}
+    response = await self.request(
+      'POST', path, operation='upload_asset', payload_size=os.path.getsize(wrapped_file),
+      cookies=cookies, headers=headers, data=body,
+    )
+    return response
+
+
+  async def get_asset(self, author_name, long_user_id, sha256):
+    # Returns the node's metadata for the asset with this hash, or None if the node doesn't have it.
+    path = self.build_path(asset_path, a=author_name, h=sha256)
+    cookies = {'edgecase_long_user_id': long_user_id}
+    response = await self.request('GET', path, operation='get_asset', idempotent=True, cookies=cookies)
+    if response.status_code == 404:
+      return None
+    response.raise_for_status()
+    result = response.json()
+    metadata = result['data']
+    return metadata
+
+
+  def stream_list_drafts(self, author_name, offset=None, limit=None, etag=None, last_modified=None):
+    # Like list_drafts_conditional, but the drafts are parsed as the response body arrives.
+    # Returns drafts, etag, last_modified. drafts is an iterator, or None if the node answered 304 Not Modified.
+    # offset and limit select part of the list. If the node doesn't apply them (see list_drafts_page), they are applied here, to the whole list.
+    # Note: This is a synchronous method. The iterator reads the response body in the calling thread.
+    drafts, etag, last_modified, paged = self.list_drafts_page(author_name, offset, limit, etag, last_modified)
+    if drafts is not None and not paged and (offset or limit is not None):
+      drafts = slice_drafts(drafts, offset or 0, limit)
+    return drafts, etag, last_modified
+
+
+  def list_drafts_page(self, author_name, offset=None, limit=None, etag=None, last_modified=None):
+    # Returns drafts, etag, last_modified, paged.
+    # offset and limit are sent as query parameters, unless the node is known not to support them. paged is True if the node confirmed (with the paging_header) that it applied them. Otherwise, drafts is the whole list: a response that doesn't confirm it might be either, so it is discarded, and the whole list is requested again. The node is then sent no paging parameters from then on.
+    path = self.build_path(list_drafts_path, a=author_name)
+    headers = {}
+    if etag:
+      headers['If-None-Match'] = etag
+    if last_modified:
+      headers['If-Modified-Since'] = last_modified
+    params = {}
+    if offset:
+      params['offset'] = offset
+    if limit is not None:
+      params['limit'] = limit
+    if self.nodes.choose().paging is False:
+      params = {}
+    while True:
+      response = self.run(self.hedged_request(
+        'GET', path, operation='list_drafts', headers=headers, params=params, stream=True,
+      ))
+      if response.status_code == 304:
+        response.close()
+        return None, etag, last_modified, False
+      if not response.ok:
+        response.close()
+        response.raise_for_status()
+      if not params:
+        break
+      node = response.node
+      node.paging = paging_header in response.headers
+      if node.paging:
+        break
+      log("Node {} didn't confirm that it applied the offset and limit parameters. Listing all drafts instead.".format(node.domain))
+      response.close()
+      params = {}
+
+    def drafts():
+      try:
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+        chunks = (decoder.decode(x) for x in response.iter_content(stream_chunk_size))
+        for draft in util.json_stream.iter_array_items(chunks, 'data'):
+          yield draft
+      finally:
+        response.close()
+
+    return drafts(), response.headers.get('ETag'), response.headers.get('Last-Modified'), bool(params)
+
+
+  def iter_drafts(self, author_name, offset=0, limit=None, page_size=None):
+    # Yields drafts as they are parsed.
+    # If page_size is set, the drafts are fetched in pages of up to page_size, until a page is short or limit drafts have been yielded.
+    # If the node doesn't apply the offset and limit parameters (see list_drafts_page), it sends the whole list instead. The drafts before offset are then skipped here, and the rest are yielded (up to limit), without requesting more pages.
+    count = 0
+    while limit is None or count < limit:
+      n = page_size
+      if limit is not None:
+        n = limit - count if n is None else min(n, limit - count)
+      drafts, etag, last_modified, paged = self.list_drafts_page(author_name, offset + count, n)
+      if not paged:
+        drafts = slice_drafts(drafts, offset + count, None if limit is None else limit - count)
+        n = None
+      received = 0
+      try:
+        for draft in drafts:
+          received += 1
+          if n is not None and received > n:
+            msg = "The node returned more than {} drafts, although it confirmed that it applied the limit.".format(n)
+            raise ValueError(msg)
+          count += 1
+          yield draft
+      finally:
+        drafts.close()
+      if n is None or received < n:
+        return
+
+
+  def run(self, coroutine):
+    # Run a coroutine to completion from synchronous code.
+    # If the loop is running on its own thread (see start_loop_thread), this can be called from several threads at once.
+    if self.loop_thread is not None:
+      import asyncio
+      return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+    return self.loop.run_until_complete(coroutine)
+
+
+  def start_loop_thread(self):
+    # Run the event loop on a background thread until stop_loop_thread is called.
+    if self.loop_thread is None:
+      self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+      self.loop_thread.start()
+
+
+  def stop_loop_thread(self):
+    if self.loop_thread is not None:
+      self.loop.call_soon_threadsafe(self.loop.stop)
+      self.loop_thread.join()
+      self.loop_thread = None
+
+
+  def run_all(self, coroutines):
+    # Run several coroutines concurrently from synchronous code. Results are returned in input order.
+    import asyncio
+    async def gather():
+      return await asyncio.gather(*coroutines)
+    return self.run(gather())
+
+
+  def close(self):
+    self.stop_loop_thread()
+    self.executor.shutdown(wait=True)
+    self.session.close()
+    self.loop.close()
@@ -0,0 +1,135 @@
+# Imports
+import os
+import re
+import logging
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+join = os.path.join
+isfile = os.path.isfile
+dirname = os.path.dirname
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - An article refers to an asset (e.g. an image) with a link element whose type is 'asset'. The link gives the asset's file name and its sha256 hash:
+# <link>
+# <type>asset</type>
+# <filename>bitcoin_transaction.png</filename>
+# <text>the diagram</text>
+# <sha256>9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08</sha256>
+# </link>
+# - The links are found with a pattern, so the article doesn't need to be parsed (or verified) first.
+# - Asset files are looked for in the asset directory, which by default is the directory that contains the article.
+
+
+
+
+# Settings
+link_pattern = re.compile(r'<link>(.*?)</link>', re.DOTALL)
+link_tag_pattern = re.compile(r'<(type|filename|sha256)>\s*([^<]*?)\s*</\1>')
+sha256_pattern = re.compile(r'^[0-9a-f]{64}$')
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def find_asset_links(data):
+  # Returns a list of dicts (file_name, sha256), one per distinct asset, in order of first appearance.
+  result = []
+  seen = set()
+  for match in link_pattern.finditer(data):
+    tags = dict(link_tag_pattern.findall(match.group(1)))
+    if tags.get('type') != 'asset':
+      continue
+    file_name = tags.get('filename', '')
+    sha256 = tags.get('sha256', '')
+    if (file_name, sha256) in seen:
+      continue
+    seen.add((file_name, sha256))
+    result.append({'file_name': file_name, 'sha256': sha256})
+  return result
+
+
+
+
+def find_assets(article_file, asset_dir=None, workers=util.hashing.default_workers):
+  # Find the assets that an article links to, and hash their files concurrently.
+  # Returns a list of asset dicts. An asset whose file is missing, or whose hash doesn't match the one in its link, has a problem message.
+  if asset_dir is None:
+    asset_dir = dirname(article_file)
+  with open(article_file) as f:
+    data = f.read()
+  assets = find_asset_links(data)
+  for asset in assets:
+    asset['file_path'] = join(asset_dir, asset['file_name'])
+    asset['size'] = 0
+    asset['problem'] = ''
+    if asset['file_name'] == '' or asset['file_name'] != os.path.basename(asset['file_name']):
+      asset['problem'] = "Invalid asset file name: '{}'".format(asset['file_name'])
+    elif not sha256_pattern.match(asset['sha256']):
+      asset['problem'] = "Invalid sha256 in link to asset: '{}'".format(asset['sha256'])
+    elif not isfile(asset['file_path']):
+      asset['problem'] = "Asset file not found at path: {}".format(asset['file_path'])
+  file_paths = [x['file_path'] for x in assets if x['problem'] == '']
+  digests = util.hashing.sha256_files(file_paths, workers=workers)
+  for asset in assets:
+    if asset['problem'] != '':
+      continue
+    asset['size'] = os.path.getsize(asset['file_path'])
+    digest = digests[asset['file_path']]
+    if digest != asset['sha256']:
+      msg = "Asset file {f} has sha256 {h}, but the article's link to it has sha256 {s}."
+      asset['problem'] = msg.format(f=asset['file_path'], h=digest, s=asset['sha256'])
+  return assets
+
+
+
+
+def check_metadata(asset, metadata):
+  # Compare the node's metadata for an asset with the local asset. Returns a problem message, or '' if they match.
+  if metadata is None:
+    return "The node has no asset with sha256 {}.".format(asset['sha256'])
+  if metadata.get('sha256') != asset['sha256']:
+    return "The node's asset has sha256 {}.".format(metadata.get('sha256'))
+  if 'size' in metadata and int(metadata['size']) != asset['size']:
+    return "The node's asset has size {n}, but the local file has size {s}.".format(n=metadata['size'], s=asset['size'])
+  return ''
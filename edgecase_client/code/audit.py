@@ -0,0 +1,223 @@
+# Imports
+import os
+import re
+import time
+import logging
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+join = os.path.join
+basename = os.path.basename
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - A file name audit checks each file name against the article header within the file, without parsing or verifying the whole article.
+# - The file name is parsed in one regex match (util.validate.parse_file_name). The header values are found by a tag pattern in the first part of the file.
+# - A signed article or datafeed article contains other articles, so its header section can contain several dates and author names. Each date and author name in the file name must be one of those found in the header section.
+# - An archive verification (verify_archive) is the full check: each article's content, file name and signature are verified by edgecase_article.
+
+
+
+
+# Settings
+# The header tags appear before the article content, so only the start of each file is read.
+header_read_size = 64 * 1024  # bytes
+header_tag_pattern = re.compile(r'<(date|author_name|uri_title)>([^<\n]*)</\1>')
+default_chunk_size = 256
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def find_archive_files(directory):
+  # Returns all .txt files within the directory, including those in subdirectories, in sorted order.
+  result = []
+  for root, dirs, files in os.walk(directory):
+    for name in files:
+      if name.endswith('.txt'):
+        result.append(join(root, name))
+  return sorted(result)
+
+
+
+
+def read_header_values(file_path):
+  # Returns a dict of tag -> list of values found in the first part of the file.
+  with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+    text = f.read(header_read_size)
+  values = {'date': [], 'author_name': [], 'uri_title': []}
+  for tag, value in header_tag_pattern.findall(text):
+    values[tag].append(value)
+  return values
+
+
+
+
+def audit_file(file_path):
+  # Returns a list of problems with the file's name. An empty list means no problems were found.
+  file_name = basename(file_path)
+  parsed = util.validate.parse_file_name(file_name)
+  if parsed is None:
+    return ["File name doesn't match any known article file name format."]
+  problems = []
+  try:
+    header = read_header_values(file_path)
+  except OSError as e:
+    return ['Could not read file: {}'.format(e)]
+  for key in ['datafeed_date', 'date']:
+    d = parsed[key]
+    if d is None:
+      continue
+    try:
+      util.validate.validate_date(d, key + ' (in file name)')
+    except ValueError as e:
+      problems.append(str(e))
+      continue
+    if d not in header['date']:
+      problems.append("Date {} ({}) in file name not found in header dates {}.".format(
+        repr(d), key, header['date']
+      ))
+  rest = parsed['author_and_uri_title']
+  if rest is not None:
+    authors = [x for x in header['author_name'] if rest.startswith(x + '_')]
+    if not authors:
+      problems.append("File name section {} doesn't start with any header author_name {}.".format(
+        repr(rest), header['author_name']
+      ))
+    elif header['uri_title']:
+      # Only some article formats contain a uri_title tag. If this one does, check it too.
+      uri_titles = [rest[len(x) + 1:] for x in authors]
+      if not any(u in header['uri_title'] for u in uri_titles):
+        problems.append("uri_title in file name ({}) not found in header uri_titles {}.".format(
+          ' or '.join(repr(u) for u in uri_titles), header['uri_title']
+        ))
+  return problems
+
+
+
+
+def audit_file_result(file_path):
+  try:
+    problems = audit_file(file_path)
+  except Exception as e:
+    problems = ['{}: {}'.format(type(e).__name__, e)]
+  return file_path, problems
+
+
+
+
+def audit_file_names(file_paths, workers=None, chunk_size=default_chunk_size, callback=None):
+  # Audit many files across a pool of worker processes.
+  # The files are sent to the workers in chunks, to keep the per-file overhead low.
+  # callback: optional function (file_path, problems), called for each file as its result arrives.
+  # Returns a list of (file_path, problems) for the files with problems, and the number of files audited.
+  import concurrent.futures
+  mismatches = []
+  count = 0
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+    results = executor.map(audit_file_result, file_paths, chunksize=chunk_size)
+    for file_path, problems in results:
+      count += 1
+      if callback is not None:
+        callback(file_path, problems)
+      if problems:
+        mismatches.append((file_path, problems))
+  return mismatches, count
+
+
+
+
+def verify_archive_file(file_path, article_type, public_key_dir):
+  # Fully verify one archived article: content, file name, and signature.
+  # Returns (file_path, error, duration). error is None if the article is valid.
+  from . import client
+  start = time.time()
+  error = None
+  try:
+    edgecase_article = client.load_edgecase_article()
+    edgecase_article.verify(
+      article_file = file_path,
+      article_type = article_type,
+      verify_file_name = True,
+      verify_signature = True,
+      verify_content = True,
+      public_key_dir = public_key_dir,
+      verify_assets = False,
+    )
+  except Exception as e:
+    # Not every exception can be pickled back from a worker process, so the error is returned as a string.
+    error = '{}: {}'.format(type(e).__name__, e)
+  return file_path, error, time.time() - start
+
+
+
+
+def verify_archive(file_paths, article_type, public_key_dir, workers=None, callback=None):
+  # Verify many archived articles across a pool of worker processes.
+  # Results are handled as they complete, not in input order. At most a few tasks per worker are queued at once, so memory use doesn't grow with the size of the archive.
+  # callback: optional function (file_path, error, duration), called for each result as it arrives.
+  # Returns a list of (file_path, error) failures, and a list of per-file durations.
+  import concurrent.futures
+  failures = []
+  durations = []
+  if workers is None:
+    workers = os.cpu_count() or 1
+  max_pending = workers * 4
+  file_paths = iter(file_paths)
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+    pending = set()
+    while True:
+      for file_path in file_paths:
+        pending.add(executor.submit(verify_archive_file, file_path, article_type, public_key_dir))
+        if len(pending) >= max_pending:
+          break
+      if not pending:
+        break
+      done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+      for future in done:
+        file_path, error, duration = future.result()
+        durations.append(duration)
+        if error is not None:
+          failures.append((file_path, error))
+        if callback is not None:
+          callback(file_path, error, duration)
+  return failures, durations
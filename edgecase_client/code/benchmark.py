@@ -0,0 +1,475 @@
+# Imports
+import os
+import sys
+import time
+import logging
+import statistics
+import subprocess
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+dirname = os.path.dirname
+abspath = os.path.abspath
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - Each benchmark function returns a list of rows (dicts). run() formats them as a table.
+# - Benchmarks are registered in the benchmarks dict at the bottom of this module.
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def run(name, **kwargs):
+  if name not in benchmarks:
+    msg = "Unrecognised benchmark: {}. Benchmark list: {}".format(name, sorted(benchmarks))
+    raise ValueError(msg)
+  rows = benchmarks[name](**kwargs)
+  return util.misc.format_table(rows)
+
+
+
+
+def parse_importtime(output):
+  # Parse the stderr output of 'python -X importtime'.
+  # Example line:
+  # import time:       315 |        315 |   _io
+  # Returns the total import time (in microseconds) and the number of modules imported.
+  total = 0
+  count = 0
+  for line in output.splitlines():
+    if not line.startswith('import time:'):
+      continue
+    fields = line[len('import time:'):].split('|')
+    self_us = fields[0].strip()
+    if not self_us.isdigit():
+      # Header line.
+      continue
+    total += int(self_us)
+    count += 1
+  return total, count
+
+
+
+
+def startup(cli_file, tasks, repeats=5):
+  # Measure cold-start cost per task: a fresh interpreter imports cli.py and the modules that the task needs.
+  # Requires Python 3.7+ (for -X importtime).
+  # If a task's imports fail (e.g. a missing package), its row reports the error, and the other tasks are still measured.
+  cli_dir = dirname(abspath(cli_file))
+  rows = []
+  for task in tasks:
+    row = {'task': task}
+    walls = []
+    import_times = []
+    for i in range(repeats):
+      code = "import cli; cli.import_task_modules({})".format(repr(task))
+      cmd = [sys.executable, '-X', 'importtime', '-c', code]
+      start = time.time()
+      proc = subprocess.run(cmd, cwd=cli_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+      walls.append(time.time() - start)
+      err = proc.stderr.decode('utf-8', 'replace')
+      if proc.returncode != 0:
+        log("Startup benchmark for task {} failed:\n{}".format(repr(task), err))
+        lines = [x for x in err.strip().splitlines() if not x.startswith('import time:')]
+        row['error'] = lines[-1] if lines else 'exit code {}'.format(proc.returncode)
+        break
+      total, count = parse_importtime(err)
+      import_times.append(total)
+    if 'error' not in row:
+      row['wall_ms (median)'] = statistics.median(walls) * 1000
+      row['import_ms (median)'] = statistics.median(import_times) / 1000
+      row['modules'] = count
+    rows.append(row)
+  # format_table needs the same columns in every row.
+  columns = ['task', 'wall_ms (median)', 'import_ms (median)', 'modules', 'error']
+  return [{x: row.get(x, '') for x in columns} for row in rows]
+
+
+
+
+def runner(calls=200):
+  # Measure per-call overhead of running a trivial command, and of tool discovery.
+  # The command is given by its path, so that every case starts the same executable. ('true' on its own is a shell builtin, so with shell=True no executable would be started.)
+  misc = util.misc
+  command = misc.find_tool('true') or '/bin/true'
+  cases = [
+    ('run_local_cmd, shell=True', lambda: misc.run_local_cmd(command, shell=True)),
+    ('run_local_cmd, direct exec', lambda: misc.run_local_cmd(command)),
+    ('run_cmd (argv)', lambda: misc.run_cmd([command])),
+    ("tool discovery via shell 'command -v'", lambda: misc.run_local_cmd('command -v gpg', shell=True)),
+    ('tool discovery, cached (shell_tool_exists)', lambda: misc.shell_tool_exists('gpg')),
+  ]
+  rows = []
+  for name, func in cases:
+    start = time.perf_counter()
+    for i in range(calls):
+      func()
+    elapsed = time.perf_counter() - start
+    rows.append({
+      'method': name,
+      'calls': calls,
+      'total_s': elapsed,
+      'per_call_ms': elapsed / calls * 1000,
+    })
+  return rows
+
+
+
+
+def validators(count=1000000):
+  # Measure validator throughput on valid values (the common case in an archive audit).
+  v = util.validate
+  cases = [
+    ('validate_author_name', v.validate_author_name, ('stjohn_piano',)),
+    ('validate_uri_title', v.validate_uri_title, ('recipe_for_installing_kafka_2_5_0_as_a_systemd_service_on_ubuntu_16_04',)),
+    ('validate_title', v.validate_title, ('Discussion:_Crypto_Messaging_Apps', 'article')),
+    ('validate_title (checkpoint)', v.validate_title, ('checkpoint_0', 'checkpoint_article')),
+    ('validate_hex', v.validate_hex, ('9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08',)),
+    ('validate_string_is_positive_integer', v.validate_string_is_positive_integer, ('216',)),
+    ('validate_string_is_decimal', v.validate_string_is_decimal, ('1234.56',)),
+    ('validate_date', v.validate_date, ('2021-04-12',)),
+  ]
+  rows = []
+  for name, func, args in cases:
+    start = time.perf_counter()
+    for i in range(count):
+      func(*args)
+    elapsed = time.perf_counter() - start
+    rows.append({
+      'validator': name,
+      'values': count,
+      'total_s': elapsed,
+      'ns_per_value': elapsed / count * 1e9,
+      'values_per_s': int(count / elapsed),
+    })
+  return rows
+
+
+
+
+def schema(count=100000):
+  # Measure how long the compiled article header schema takes to validate a batch of records. One record in every hundred is invalid.
+  valid = {
+    'date': '2021-04-12',
+    'author_name': 'stjohn_piano',
+    'uri_title': 'discussion_crypto_messaging_apps',
+    'title': 'Discussion:_Crypto_Messaging_Apps',
+    'article_type': 'signed_article',
+    'signed_by_author': 'yes',
+  }
+  invalid = dict(valid, date='2021-4-12', uri_title='Discussion')
+  records = [invalid if i % 100 == 0 else valid for i in range(count)]
+  start = time.perf_counter()
+  report = util.schema.validate_article_headers(records)
+  elapsed = time.perf_counter() - start
+  rows = [{
+    'records': count,
+    'failed': len(report),
+    'total_s': elapsed,
+    'records_per_s': int(count / elapsed),
+  }]
+  return rows
+
+
+
+
+# Run in a child process by upload_memory. Prints a JSON result line.
+upload_memory_child = """
+import os, sys, json, resource
+import edgecase_client
+mode, article_file, work_dir, domain = sys.argv[1:5]
+def rss_mb():
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+c = edgecase_client.Client(
+  config_file = os.path.join(work_dir, 'config.ini'),
+  public_key_dir = work_dir,
+  private_key_dir = work_dir,
+  domain = domain,
+  use_gpg_pool = True,
+  stream_uploads = mode != 'in_memory',
+)
+import requests
+c.author_private_key, c.edgecase_public_key, c.api
+baseline = rss_mb()
+if mode == 'streamed + verify':
+  response = c.upload_draft(article_file)
+elif mode == 'streamed':
+  wrapped_file = c.wrap_file(article_file)
+  try:
+    response = c.api.run(c.api.upload_draft_file(c.author_name, c.long_user_id, wrapped_file))
+  finally:
+    os.remove(wrapped_file)
+else:
+  with open(article_file) as f:
+    wrapped_data = c.wrap_data(f.read())
+  response = c.api.run(c.api.upload_draft(c.author_name, c.long_user_id, wrapped_data))
+response.raise_for_status()
+c.close()
+print(json.dumps({'baseline_rss_mb': baseline, 'peak_rss_mb': rss_mb()}))
+"""
+
+
+
+
+def write_incompressible_draft(file_path, size_mb):
+  # Lines of random base64 text, so that gpg's compression doesn't shrink the upload.
+  import base64
+  with open(file_path, 'w') as f:
+    f.write('<uri_title>upload_memory_benchmark</uri_title>\n')
+    for i in range(size_mb * 1024):
+      block = base64.b64encode(os.urandom(768)).decode('ascii')
+      f.write('\n'.join(block[j:j + 64] for j in range(0, len(block), 64)) + '\n')
+
+
+
+
+def upload_memory(size_mb=500, article_file=None):
+  # Measure the peak RSS (ru_maxrss) of a child process that uploads a draft of size_mb megabytes with a real Client:
+  # - in_memory: wrap_data and APIClient.upload_draft (the default upload path, without verification).
+  # - streamed: wrap_file and APIClient.upload_draft_file (the --stream upload path, without verification).
+  # - streamed + verify: Client.upload_draft with stream_uploads=True, which verifies the draft first. This needs the edgecase_article package and a valid draft (article_file). Without them, its row reports the error.
+  # The mock node runs in a separate process, because it holds each request body in memory.
+  # Uses a throwaway key pair. Requires gpg, and Linux (where ru_maxrss is in kilobytes).
+  import json
+  import shutil
+  import socket
+  import tempfile
+  from . import gpg_pool
+  root_dir = dirname(dirname(dirname(abspath(__file__))))
+  work_dir = tempfile.mkdtemp(prefix='edgecase_benchmark_')
+  keyring = gpg_pool.Keyring()
+  node = None
+  try:
+    private_key, public_key = make_benchmark_keys(keyring)
+    with open(os.path.join(work_dir, 'benchmark_private_key.txt'), 'w') as f:
+      f.write(private_key)
+    from . import client
+    with open(os.path.join(work_dir, client.edgecase_public_key_file_name), 'w') as f:
+      f.write(public_key)
+    with open(os.path.join(work_dir, 'config.ini'), 'w') as f:
+      f.write('[user]\nauthor_name = benchmark\nauthor_key_name = benchmark\nlong_user_id = 1\n')
+    synthetic_file = os.path.join(work_dir, 'draft.txt')
+    write_incompressible_draft(synthetic_file, size_mb)
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    code = 'import time; from edgecase_client.code import mock_node; mock_node.MockNode(port={}).start(); time.sleep(10 ** 6)'
+    node = subprocess.Popen([sys.executable, '-c', code.format(port)], cwd=root_dir)
+    for i in range(100):
+      try:
+        socket.create_connection(('127.0.0.1', port), timeout=1).close()
+        break
+      except OSError:
+        time.sleep(0.1)
+    domain = '127.0.0.1:{}'.format(port)
+    rows = []
+    for mode in ['in_memory', 'streamed', 'streamed + verify']:
+      draft_file = synthetic_file
+      if mode == 'streamed + verify' and article_file is not None:
+        draft_file = article_file
+      row = {'mode': mode, 'draft_mb': os.path.getsize(draft_file) / 1e6}
+      cmd = [sys.executable, '-c', upload_memory_child, mode, abspath(draft_file), work_dir, domain]
+      start = time.perf_counter()
+      proc = subprocess.run(cmd, cwd=root_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+      row['total_s'] = time.perf_counter() - start
+      if proc.returncode == 0:
+        row.update(json.loads(proc.stdout.decode('utf-8').strip().splitlines()[-1]))
+      else:
+        err = proc.stderr.decode('utf-8', 'replace').strip().splitlines()
+        row['error'] = err[-1] if err else 'exit code {}'.format(proc.returncode)
+      rows.append(row)
+  finally:
+    if node is not None:
+      node.kill()
+      node.wait()
+    keyring.close()
+    shutil.rmtree(work_dir, ignore_errors=True)
+  # format_table needs the same columns in every row.
+  columns = ['mode', 'draft_mb', 'baseline_rss_mb', 'peak_rss_mb', 'total_s', 'error']
+  return [{x: row.get(x, '') for x in columns} for row in rows]
+
+
+
+
+def pipeline(count=40, stage_times=(0.01, 0.02, 0.015)):
+  # Compare running simulated verify, wrap and upload steps (sleeps of stage_times seconds) in sequence for each item, with running them as a pipeline with one worker per stage.
+  # The pipeline's wall time should approach count * max(stage_times), rather than count * sum(stage_times).
+  from . import pipeline as p
+
+  def step(seconds):
+    def func(value):
+      time.sleep(seconds)
+      return value
+    return func
+
+  names = ['verify', 'wrap', 'upload']
+  funcs = [step(x) for x in stage_times]
+  start = time.perf_counter()
+  for i in range(count):
+    for func in funcs:
+      func(i)
+  sequential = time.perf_counter() - start
+  stages = [p.Stage(name, func, workers=1) for name, func in zip(names, funcs)]
+  pl = p.Pipeline(stages)
+  start = time.perf_counter()
+  pl.run(range(count))
+  pipelined = time.perf_counter() - start
+  rows = [
+    {'mode': 'sequential', 'items': count, 'total_s': sequential, 'expected_s': count * sum(stage_times)},
+    {'mode': 'pipeline', 'items': count, 'total_s': pipelined, 'expected_s': count * max(stage_times)},
+  ]
+  return rows
+
+
+
+
+def make_text(size, seed=0):
+  # Returns about size bytes of article-like text (random words from a small vocabulary), which compresses roughly as real prose does.
+  import random
+  r = random.Random(seed)
+  words = (
+    'the of and to in a is that for it as was with be by on not he this are or his from at which but '
+    'have an they you were her she there been one all we their has would when if so no will more can '
+    'node draft article key signature upload network data time value system should first because'
+  ).split()
+  paragraphs = []
+  total = 0
+  while total < size:
+    paragraph = ' '.join(r.choice(words) for i in range(r.randint(40, 120))).capitalize() + '.'
+    paragraphs.append(paragraph)
+    total += len(paragraph) + 2
+  return '\n\n'.join(paragraphs)[:size]
+
+
+
+
+def make_benchmark_keys(keyring):
+  # Generate a throwaway key pair (without a passphrase) in keyring. Returns private_key, public_key (armoured).
+  # The key parameters are passed to '--gen-key' in batch mode, which works with GPG 1.4 and 2.x. (GPG 1.4 skips the '%no-protection' line, and doesn't protect the key anyway, because no passphrase is given.)
+  email = 'benchmark@example.invalid'
+  parameters = '\n'.join([
+    '%no-protection',
+    'Key-Type: RSA',
+    'Key-Length: 2048',
+    'Subkey-Type: RSA',
+    'Subkey-Length: 2048',
+    'Name-Real: edgecase_benchmark',
+    'Name-Email: ' + email,
+    'Expire-Date: 0',
+    '%commit',
+    '',
+  ])
+  keyring.gpg(['--gen-key'], input=parameters)
+  public_key, err = keyring.gpg(['--armor', '--export', email])
+  private_key, err = keyring.gpg(['--armor', '--export-secret-keys', email])
+  return private_key, public_key
+
+
+
+
+def upload_bytes(count=20, size_kb=20):
+  # Measure the bytes on the wire per draft upload (request line, headers and multipart body), for drafts of size_kb kilobytes, wrapped as ASCII armour versus binary GPG output.
+  # 'binary (fallback)' uploads to a node that rejects binary uploads: the first draft is sent twice, and the rest are sent armoured.
+  # Uses a throwaway key pair and local mock nodes. Requires gpg.
+  from . import api
+  from . import gpg_pool
+  from . import mock_node
+  keyring = gpg_pool.Keyring()
+  nodes = []
+  try:
+    private_key, public_key = make_benchmark_keys(keyring)
+    texts = [
+      '<uri_title>benchmark_{}</uri_title>\n'.format(i) + make_text(size_kb * 1024, seed=i)
+      for i in range(count)
+    ]
+    plain = sum(len(x.encode('utf-8')) for x in texts)
+    modes = [
+      ('armor', True, True),
+      ('binary', False, True),
+      ('binary (fallback)', False, False),
+    ]
+    rows = []
+    for mode, armor, accept_binary in modes:
+      node = mock_node.MockNode(port=0, accept_binary=accept_binary).start()
+      nodes.append(node)
+      c = api.APIClient(domain=node.domain, concurrency=1)
+      wrapped = 0
+      start = time.perf_counter()
+      try:
+        for text in texts:
+          wrapped_data = keyring.wrap_data(private_key, public_key, text, armor)
+          wrapped += len(wrapped_data)
+          response = c.run(c.upload_draft('benchmark', '1', wrapped_data, binary=not armor))
+          response.raise_for_status()
+      finally:
+        c.close()
+      elapsed = time.perf_counter() - start
+      rows.append({
+        'mode': mode,
+        'drafts': count,
+        'plain_bytes': plain // count,
+        'wrapped_bytes': wrapped // count,
+        'wire_bytes': node.bytes_received // count,
+        'total_s': elapsed,
+      })
+    for row in rows:
+      row['vs_armor'] = '{:.0%}'.format(row['wire_bytes'] / rows[0]['wire_bytes'])
+  finally:
+    for node in nodes:
+      node.stop()
+    keyring.close()
+  return rows
+
+
+
+
+benchmarks = {
+  'startup': startup,
+  'runner': runner,
+  'validators': validators,
+  'schema': schema,
+  'uploadMemory': upload_memory,
+  'pipeline': pipeline,
+  'uploadBytes': upload_bytes,
+}
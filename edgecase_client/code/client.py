@@ -0,0 +1,731 @@
+# Imports
+import os
+import glob
+import time
+import logging
+import tempfile
+
+
+
+
+# Relative imports
+from .. import util
+from . import api
+from . import config
+from . import verify_cache
+from . import manifest
+from . import gpg_pool
+from . import assets
+from . import list_cache
+from . import pipeline
+
+
+
+
+# Shortcuts
+isfile = os.path.isfile
+isdir = os.path.isdir
+join = os.path.join
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Settings
+edgecase_public_key_file_name = 'edgecase_datafeed_2_public_key.txt'
+default_public_key_dir = '../keys/public_keys'
+default_private_key_dir = '../keys/private_keys'
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def load_edgecase_article():
+  # The edgecase_article package (and the stateless_gpg package within it) is slow to import, and only the article tasks need it, so it is imported on first use.
+  from .. import submodules
+  return submodules.edgecase_article
+
+
+
+
+def load_gpg():
+  edgecase_article = load_edgecase_article()
+  return edgecase_article.edgecase_article.submodules.stateless_gpg.gpg
+
+
+
+
+class Client:
+
+
+  # Notes:
+  # - A Client loads the config once. Key files are read on first use and then kept, so a long-lived process can handle many articles without re-reading them.
+  # - Node requests go through a single APIClient, which is also created on first use.
+  # - The nodes to use are, in order of precedence: domains (a list), the domains in the [node] section of the config file, or domain.
+  # - Single-article methods raise on failure. Batch methods report a result per article instead.
+  # - If cache_dir is set, successful verifications are cached there (see verify_cache.py), so unchanged drafts are not re-verified. Draft listings are also cached there for list_ttl seconds (see list_cache.py).
+  # - If use_gpg_pool is True, drafts are wrapped using a pool of up to concurrency warm keyrings (see gpg_pool.py) instead of stateless_gpg, so keys are imported once per keyring rather than once per draft.
+  # - Assets are always wrapped with the keyring pool, because they are binary files, and are streamed from temporary files. The pool is created when first needed.
+  # - If binary_uploads is True, drafts are wrapped as binary OpenPGP data rather than ASCII armour, and uploaded as such to nodes that accept it (see APIClient). Drafts wrapped by stateless_gpg are converted to binary in Python.
+  # - If stream_uploads is True, gpg reads each draft from its file and writes the wrapped output to a temporary file, which is then uploaded as a stream, so the wrap and upload steps don't hold the draft in memory. (Verification still reads the whole draft.) This uses the keyring pool, so it implies use_gpg_pool.
+
+
+  def __init__(
+      self,
+      config_file = config.default_config_file,
+      public_key_dir = default_public_key_dir,
+      private_key_dir = default_private_key_dir,
+      domain = api.default_domain,
+      timeout = api.default_timeout,
+      concurrency = api.default_concurrency,
+      retries = api.default_retries,
+      hedge_after = None,
+      domains = None,
+      fan_out = 1,
+      cache_dir = None,
+      verify_cache_max_bytes = verify_cache.default_max_bytes,
+      list_ttl = list_cache.default_ttl,
+      use_gpg_pool = False,
+      stream_uploads = False,
+      binary_uploads = False,
+      ):
+    values = config.load_config(config_file)
+    self.author_name = values['author_name']
+    self.author_key_name = values['author_key_name']
+    self.long_user_id = values['long_user_id']
+    self.public_key_dir = public_key_dir
+    self.private_key_dir = private_key_dir
+    self.domains = domains or values['domains'] or [domain]
+    self.domain = self.domains[0]
+    self.fan_out = fan_out
+    self.timeout = timeout
+    self.concurrency = concurrency
+    self.retries = retries
+    self.hedge_after = hedge_after
+    self.cache_dir = cache_dir
+    self.verify_cache_max_bytes = verify_cache_max_bytes
+    self.list_ttl = list_ttl
+    self.stream_uploads = stream_uploads
+    self.binary_uploads = binary_uploads
+    self.keyrings = None
+    if use_gpg_pool or stream_uploads:
+      self.keyrings = gpg_pool.KeyringPool(concurrency)
+    self._edgecase_public_key = None
+    self._author_private_key = None
+    self._api = None
+    self._list_cache = None
+    self.upload_report = []
+
+
+  @property
+  def edgecase_public_key(self):
+    if self._edgecase_public_key is None:
+      key_file = join(self.public_key_dir, edgecase_public_key_file_name)
+      if not isfile(key_file):
+        msg = "Could not find Edgecase public key file at path: {}".format(key_file)
+        raise FileNotFoundError(msg)
+      with open(key_file) as f:
+        self._edgecase_public_key = f.read()
+    return self._edgecase_public_key
+
+
+  @property
+  def author_private_key(self):
+    if self._author_private_key is None:
+      key_file = join(self.private_key_dir, self.author_key_name + '_private_key.txt')
+      if not isfile(key_file):
+        msg = "Author private key file not found at path: {}".format(key_file)
+        raise FileNotFoundError(msg)
+      with open(key_file) as f:
+        self._author_private_key = f.read()
+    return self._author_private_key
+
+
+  @property
+  def api(self):
+    if self._api is None:
+      self._api = api.APIClient(
+        domain = self.domain,
+        timeout = self.timeout,
+        concurrency = self.concurrency,
+        retries = self.retries,
+        hedge_after = self.hedge_after,
+        domains = self.domains,
+        fan_out = self.fan_out,
+      )
+    return self._api
+
+
+  @property
+  def verify_cache_dir(self):
+    if self.cache_dir is None:
+      return None
+    return join(self.cache_dir, 'verify')
+
+
+  @property
+  def list_cache(self):
+    if self.cache_dir is None:
+      return None
+    if self._list_cache is None:
+      self._list_cache = list_cache.ListCache(join(self.cache_dir, 'drafts'), self.list_ttl)
+    return self._list_cache
+
+
+  def invalidate_list_cache(self):
+    if self.list_cache is not None:
+      self.list_cache.invalidate(self.author_name)
+
+
+  def verify_article(self, article_file):
+    return verify_article(article_file, self.verify_cache_dir, self.verify_cache_max_bytes)
+
+
+  def verify_draft(self, article_file):
+    # Also check that the draft can be wrapped with this author's key.
+    draft_article = self.verify_article(article_file)
+    if draft_article.author_name != self.author_key_name:
+      msg = "Author key name is '{k}', but author name found in draft is '{d}'."
+      msg = msg.format(d=draft_article.author_name, k=self.author_key_name)
+      raise ValueError(msg)
+    return draft_article
+
+
+  def wrap_draft(self, article_file):
+    draft_article = self.verify_draft(article_file)
+    return self.wrap_data(draft_article.data)
+
+
+  def wrap_data(self, data):
+    # Returns armoured text, or, if binary_uploads is True, bytes.
+    armor = not self.binary_uploads
+    if self.keyrings is not None:
+      wrapped_data = self.keyrings.wrap_data(self.author_private_key, self.edgecase_public_key, data, armor)
+      return wrapped_data
+    gpg = load_gpg()
+    wrapped_data = gpg.wrap_data(self.author_private_key, self.edgecase_public_key, data)
+    if not armor:
+      wrapped_data = util.pgp_armor.dearmor(wrapped_data)
+    return wrapped_data
+
+
+  def wrap_draft_to_file(self, article_file):
+    # Returns the path of a temporary file containing the wrapped draft. The caller must remove it.
+    # Note: The file's contents are wrapped as they are on disk.
+    self.verify_draft(article_file)
+    return self.wrap_file(article_file, armor=not self.binary_uploads)
+
+
+  def upload_draft(self, article_file):
+    response, size = self.api.run(self._upload_draft(article_file))
+    self.invalidate_list_cache()
+    return response
+
+
+  async def _upload_draft(self, article_file):
+    # Wrap the draft (on the loop's default executor), then upload it.
+    # Returns the response and the size in bytes of the wrapped draft.
+    loop = self.api.loop
+    if not self.stream_uploads:
+      wrapped_data = await loop.run_in_executor(None, self.wrap_draft, article_file)
+      response = await self.api.upload_draft(
+        self.author_name, self.long_user_id, wrapped_data, binary=self.binary_uploads,
+      )
+      return response, len(wrapped_data)
+    wrapped_file = await loop.run_in_executor(None, self.wrap_draft_to_file, article_file)
+    try:
+      size = os.path.getsize(wrapped_file)
+      response = await self.api.upload_draft_file(
+        self.author_name, self.long_user_id, wrapped_file, binary=self.binary_uploads,
+      )
+    finally:
+      os.remove(wrapped_file)
+    return response, size
+
+
+  def upload_drafts(self, article_files, callback=None):
+    # The drafts pass through a pipeline of three stages: verify, wrap and upload (see pipeline.py). Each stage has self.concurrency workers, so verifying and wrapping later drafts overlaps with uploading earlier ones.
+    # Returns a list of result dicts, in input order. callback, if given, is called with each result dict as its draft finishes.
+    # The per-stage utilisation of the last batch is kept in self.upload_report.
+    # Load the keys now, so that the worker threads don't race to do so.
+    self.author_private_key
+    self.edgecase_public_key
+    if self.keyrings is None and self.stream_uploads:
+      self.keyrings = gpg_pool.KeyringPool(self.concurrency)
+
+    def verify(r):
+      r['start'] = time.time()
+      r['draft_article'] = self.verify_draft(r['article_file'])
+      return r
+
+    def wrap(r):
+      draft_article = r.pop('draft_article')
+      if self.stream_uploads:
+        r['wrapped_file'] = self.wrap_file(r['article_file'], armor=not self.binary_uploads)
+        r['size'] = os.path.getsize(r['wrapped_file'])
+      else:
+        r['wrapped_data'] = self.wrap_data(draft_article.data)
+        r['size'] = len(r['wrapped_data'])
+      return r
+
+    def upload(r):
+      if self.stream_uploads:
+        try:
+          coroutine = self.api.upload_draft_file(
+            self.author_name, self.long_user_id, r['wrapped_file'], binary=self.binary_uploads,
+          )
+          r['response'] = self.api.run(coroutine)
+        finally:
+          os.remove(r.pop('wrapped_file'))
+      else:
+        coroutine = self.api.upload_draft(
+          self.author_name, self.long_user_id, r.pop('wrapped_data'), binary=self.binary_uploads,
+        )
+        r['response'] = self.api.run(coroutine)
+      return r
+
+    stages = [
+      pipeline.Stage('verify', verify, self.concurrency, queue_size=self.concurrency),
+      pipeline.Stage('wrap', wrap, self.concurrency, queue_size=self.concurrency),
+      pipeline.Stage('upload', upload, self.concurrency, queue_size=self.concurrency),
+    ]
+    p = pipeline.Pipeline(stages)
+
+    def finish(item):
+      item.result = upload_draft_result(item)
+      deb("Finished: {}".format(item.result['article_file']))
+      if callback is not None:
+        callback(item.result)
+
+    inputs = ({'article_file': x, 'size': 0} for x in article_files)
+    # The upload stage's workers all send requests through the API client's event loop, so it runs on its own thread for the duration of the batch.
+    self.api.start_loop_thread()
+    try:
+      items = p.run(inputs, callback=finish)
+    finally:
+      self.api.stop_loop_thread()
+    self.upload_report = p.report()
+    self.invalidate_list_cache()
+    results = [item.result for item in items]
+    return results
+
+
+  def wrap_file(self, input_file, armor=True):
+    # Returns the path of a temporary file containing the wrapped input file. The caller must remove it.
+    if self.keyrings is None:
+      self.keyrings = gpg_pool.KeyringPool(self.concurrency)
+    fd, wrapped_file = tempfile.mkstemp(prefix='edgecase_wrapped_', suffix='.txt')
+    os.close(fd)
+    try:
+      self.keyrings.wrap_file(
+        self.author_private_key, self.edgecase_public_key, input_file, wrapped_file, armor
+      )
+    except Exception:
+      os.remove(wrapped_file)
+      raise
+    return wrapped_file
+
+
+  def upload_assets(self, article_file, asset_dir=None):
+    # Upload the assets that a draft links to, and then check the node's metadata for each one.
+    # - Assets are hashed, wrapped and uploaded concurrently.
+    # - An asset that the node already has (found by its hash) is skipped.
+    # Returns a list of result dicts, one per asset, in the order that the draft links to them.
+    self.author_private_key
+    self.edgecase_public_key
+    asset_list = assets.find_assets(article_file, asset_dir, workers=self.concurrency)
+    # Create the keyring pool now, so that the worker threads don't race to do so.
+    if self.keyrings is None:
+      self.keyrings = gpg_pool.KeyringPool(self.concurrency)
+    import concurrent.futures
+    wrap_executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+    coroutines = [
+      self._upload_asset_result(wrap_executor, asset)
+      for asset in asset_list
+    ]
+    results = self.api.run_all(coroutines)
+    wrap_executor.shutdown(wait=True)
+    return results
+
+
+  async def _upload_asset_result(self, wrap_executor, asset):
+    # Record a failure instead of raising it.
+    r = {
+      'file_name': asset['file_name'],
+      'action': 'check',
+      'status': 'error',
+      'size': asset['size'],
+      'duration': 0,
+      'result': asset['problem'],
+    }
+    if asset['problem'] != '':
+      return r
+    start = time.time()
+    try:
+      metadata = await self.api.get_asset(self.author_name, self.long_user_id, asset['sha256'])
+      if assets.check_metadata(asset, metadata) == '':
+        r['action'] = 'skip'
+        r['status'] = 'ok'
+        r['result'] = 'already on node'
+      else:
+        r['action'] = 'upload'
+        wrapped_file = await self.api.loop.run_in_executor(wrap_executor, self.wrap_file, asset['file_path'])
+        try:
+          response = await self.api.upload_asset_file(
+            self.author_name, self.long_user_id, asset['file_name'], wrapped_file
+          )
+        finally:
+          os.remove(wrapped_file)
+        if not response.ok:
+          r['status'] = 'HTTP {}'.format(response.status_code)
+          r['result'] = response.text.strip()
+        else:
+          # Confirm that the node stored the asset intact.
+          metadata = await self.api.get_asset(self.author_name, self.long_user_id, asset['sha256'])
+          problem = assets.check_metadata(asset, metadata)
+          r['status'] = 'ok' if problem == '' else 'mismatch'
+          r['result'] = problem if problem != '' else response.text.strip()
+    except Exception as e:
+      r['result'] = '{}: {}'.format(type(e).__name__, e)
+    r['duration'] = time.time() - start
+    deb("Finished: {}".format(asset['file_name']))
+    return r
+
+
+  def list_drafts(self, fresh=False, max_age=None):
+    return list(self.iter_drafts(fresh=fresh, max_age=max_age))
+
+
+  def iter_drafts(self, fresh=False, max_age=None, offset=0, limit=None, page_size=None):
+    # Yields drafts as they are parsed from the node's response, so that they can be shown before the whole listing has arrived.
+    # A whole listing uses the list cache, if there is one:
+    # - A cached listing that is younger than max_age seconds (default: list_ttl) is used without contacting the node.
+    # - An older one is revalidated with a conditional request.
+    # - If fresh is True, the cache isn't read, and the full listing is fetched (and then cached).
+    # A partial listing (offset, limit or page_size) doesn't use the cache. See APIClient.iter_drafts.
+    cache = self.list_cache
+    if cache is None or offset or limit is not None or page_size is not None:
+      for draft in self.api.iter_drafts(self.author_name, offset, limit, page_size):
+        yield draft
+      return
+    entry = None if fresh else cache.get(self.author_name)
+    if entry is not None and cache.is_fresh(entry, max_age):
+      log("Draft list is cached.")
+      for draft in entry['drafts']:
+        yield draft
+      return
+    etag, last_modified = None, None
+    if entry is not None:
+      etag, last_modified = entry['etag'], entry['last_modified']
+    drafts, etag, last_modified = self.api.stream_list_drafts(
+      self.author_name, etag=etag, last_modified=last_modified,
+    )
+    if drafts is None:
+      log("Draft list is unchanged (304 Not Modified).")
+      cache.touch(self.author_name, entry)
+      for draft in entry['drafts']:
+        yield draft
+      return
+    received = []
+    for draft in drafts:
+      received.append(draft)
+      yield draft
+    cache.put(self.author_name, received, etag, last_modified)
+
+
+  def delete_draft(self, name):
+    response = self.api.run(
+      self.api.delete_draft(self.author_name, self.long_user_id, name)
+    )
+    self.invalidate_list_cache()
+    return response
+
+
+  def sync_drafts(self, article_files, manifest_file=manifest.default_manifest_file, delete=False):
+    # Upload only the drafts that are new or have changed since they were last uploaded.
+    # - A draft's name on the node is its uri_title.
+    # - A draft is uploaded if the node doesn't have it, if the manifest has no successful upload of it, or if its content hash differs from the one in the manifest.
+    # - If delete is True, drafts on the node that don't exist locally are deleted.
+    # Returns a list of result dicts, one per action.
+    m = manifest.load_manifest(manifest_file)
+    entries = m['drafts']
+    # Always check the listing with the node (a conditional request is enough).
+    remote_names = set(x['name'] for x in self.list_drafts(max_age=0))
+    results = []
+    local_names = set()
+    to_upload = {}
+    for article_file in article_files:
+      r = {
+        'name': '',
+        'article_file': article_file,
+        'action': 'skip',
+        'status': 'ok',
+        'result': '',
+      }
+      results.append(r)
+      try:
+        draft_article = self.verify_draft(article_file)
+      except Exception as e:
+        r['action'] = 'verify'
+        r['status'] = 'error'
+        r['result'] = '{}: {}'.format(type(e).__name__, e)
+        continue
+      name = draft_article.uri_title
+      r['name'] = name
+      if name in local_names:
+        r['action'] = 'verify'
+        r['status'] = 'error'
+        r['result'] = "Another local draft has the same name."
+        continue
+      local_names.add(name)
+      sha256 = util.hashing.sha256_file(article_file)
+      entry = entries.get(name)
+      if name not in remote_names:
+        r['result'] = 'new'
+      elif entry is None or entry['status'] != 'ok':
+        r['result'] = 'not uploaded'
+      elif entry['sha256'] != sha256:
+        r['result'] = 'modified'
+      else:
+        r['result'] = 'unchanged'
+        continue
+      r['action'] = 'upload'
+      r['sha256'] = sha256
+      to_upload[article_file] = r
+    # Upload the new and modified drafts.
+    upload_results = self.upload_drafts(list(to_upload.keys()))
+    now = time.strftime('%Y-%m-%d %H:%M:%S')
+    for u in upload_results:
+      r = to_upload[u['article_file']]
+      r['status'] = u['status']
+      r['result'] = u['result']
+      entries[r['name']] = {
+        'file': r['article_file'],
+        'sha256': r.pop('sha256'),
+        'status': u['status'],
+        'uploaded_at': now,
+      }
+    # Delete the remote drafts that no longer exist locally.
+    # If a local draft failed verification, its name is unknown, so it might be one of these. In this case, delete nothing.
+    n_unverified = len([r for r in results if r['action'] == 'verify'])
+    if delete and n_unverified > 0:
+      log("{} local drafts failed verification, so no remote drafts will be deleted.".format(n_unverified))
+    elif delete:
+      for name in sorted(remote_names - local_names):
+        r = {
+          'name': name,
+          'article_file': '',
+          'action': 'delete',
+          'status': 'error',
+          'result': '',
+        }
+        results.append(r)
+        try:
+          response = self.delete_draft(name)
+          r['status'] = 'ok' if response.ok else 'HTTP {}'.format(response.status_code)
+          r['result'] = response.text.strip()
+        except Exception as e:
+          r['result'] = '{}: {}'.format(type(e).__name__, e)
+        if r['status'] == 'ok':
+          entries.pop(name, None)
+    manifest.save_manifest(manifest_file, m)
+    return results
+
+
+  def sign_draft(self, article_file, output_dir):
+    # Returns the path of the signed article file.
+    output_file = sign_draft_file(
+      article_file, self.public_key_dir, self.private_key_dir, output_dir,
+      self.verify_cache_dir, self.verify_cache_max_bytes,
+    )
+    return output_file
+
+
+  def sign_drafts(self, article_files, output_dir, workers=None):
+    # GPG signing is CPU- and subprocess-bound, so the drafts are signed across a pool of worker processes.
+    # Returns a list of result dicts, in input order. A failure is reported in its result and does not stop the batch.
+    import concurrent.futures
+    if workers is None:
+      workers = self.concurrency
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+      futures = {}
+      for article_file in article_files:
+        future = executor.submit(
+          sign_draft_file_result,
+          article_file, self.public_key_dir, self.private_key_dir, output_dir,
+          self.verify_cache_dir, self.verify_cache_max_bytes,
+        )
+        futures[future] = article_file
+      for future in concurrent.futures.as_completed(futures):
+        article_file = futures[future]
+        results[article_file] = future.result()
+        deb("Finished: {}".format(article_file))
+    return [results[f] for f in article_files]
+
+
+  def latency_report(self):
+    # Returns the latency percentiles of the node requests made so far (see APIClient.latency_report).
+    if self._api is None:
+      return []
+    return self._api.latency_report()
+
+
+
+  def node_report(self):
+    # Returns the latency estimate and health of each node (see NodePool.report).
+    if self._api is None:
+      return []
+    return self._api.node_report()
+
+
+  def close(self):
+    if self.keyrings is not None:
+      self.keyrings.close()
+    if self._api is not None:
+      self._api.close()
+      self._api = None
+
+
+
+
+def verify_article(
+    article_file,
+    cache_dir = None,
+    cache_max_bytes = verify_cache.default_max_bytes,
+    ):
+  # If cache_dir is set, a previous successful verification of the same file content (with the same options) is reused.
+  # The file is hashed again after it is verified. If it changed in between (e.g. it was saved while watchDrafts was running), the result isn't cached, because it might belong to either version.
+  options = dict(
+    article_type = 'article',
+    verify_file_name = False,
+    verify_signature = False,
+    verify_content = True,
+    public_key_dir = None,
+    #verify_assets = True,
+    verify_assets = False, # use when testing.
+  )
+  cache = None
+  if cache_dir is not None:
+    cache = verify_cache.get_cache(cache_dir, cache_max_bytes)
+    key = cache.key(article_file, options)
+    draft_article = cache.get(key)
+    if draft_article is not None:
+      log("Draft article format is valid (cached).")
+      return draft_article
+  edgecase_article = load_edgecase_article()
+  draft_article = edgecase_article.verify(article_file=article_file, **options)
+  log("Draft article format is valid.")
+  if cache is not None:
+    if cache.key(article_file, options) == key:
+      cache.put(key, draft_article)
+    else:
+      log("Draft article {} changed while it was being verified. Not caching the result.".format(article_file))
+  return draft_article
+
+
+
+
+def sign_draft_file(
+    article_file, public_key_dir, private_key_dir, output_dir,
+    cache_dir = None, cache_max_bytes = verify_cache.default_max_bytes,
+    ):
+  # This is a module-level function (not a Client method), so that it can run in a worker process.
+  verify_article(article_file, cache_dir, cache_max_bytes)
+  edgecase_article = load_edgecase_article()
+  signed_article = edgecase_article.edgecase_article.code.sign.sign(
+    article_file = article_file,
+    public_key_dir = public_key_dir,
+    private_key_dir = private_key_dir,
+  )
+  output_file_name = signed_article.construct_file_name()
+  output_file = join(output_dir, output_file_name)
+  with open(output_file, 'w') as f:
+    f.write(signed_article.data + '\n')
+  return output_file
+
+
+
+
+def upload_draft_result(item):
+  # Make a result dict for a draft that has left the upload pipeline. A failure is recorded instead of raised.
+  r = item.value
+  result = {
+    'article_file': r['article_file'],
+    'status': 'error',
+    'size': r['size'],
+    'duration': time.time() - r['start'],
+    'result': '',
+  }
+  if item.error is not None:
+    result['result'] = '{}: {}'.format(type(item.error).__name__, item.error)
+    return result
+  response = r['response']
+  result['status'] = 'ok' if response.ok else 'HTTP {}'.format(response.status_code)
+  result['result'] = response.text.strip()
+  return result
+
+
+
+
+def sign_draft_file_result(
+    article_file, public_key_dir, private_key_dir, output_dir,
+    cache_dir = None, cache_max_bytes = verify_cache.default_max_bytes,
+    ):
+  # Record a failure instead of raising it. (Not every exception can be pickled back from a worker process, so the error is returned as a string.)
+  r = {
+    'article_file': article_file,
+    'status': 'error',
+    'duration': 0,
+    'result': '',
+  }
+  start = time.time()
+  try:
+    r['result'] = sign_draft_file(
+      article_file, public_key_dir, private_key_dir, output_dir,
+      cache_dir, cache_max_bytes,
+    )
+    r['status'] = 'ok'
+  except Exception as e:
+    r['result'] = '{}: {}'.format(type(e).__name__, e)
+  r['duration'] = time.time() - start
+  return r
+
+
+
+
+def find_article_files(articles):
+  # articles can be a directory or a glob pattern.
+  if isdir(articles):
+    articles = join(articles, '*.txt')
+  article_files = sorted(glob.glob(articles))
+  article_files = [f for f in article_files if isfile(f)]
+  return article_files
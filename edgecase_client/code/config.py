@@ -0,0 +1,101 @@
+# Imports
+import os
+import logging
+import configparser
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+isfile = os.path.isfile
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - The optional [node] section can list the Edgecase nodes to use, e.g.
+# [node]
+# domains = edgecase.net, https://backup.example.net, 127.0.0.1:8765
+# - Domains are separated by commas and/or whitespace. If there is no [node] section, the client's default domain is used.
+
+
+
+
+# Settings
+default_config_file = 'config.ini'
+expected_sections = 'user'.split()
+expected_user_keys = 'author_name author_key_name long_user_id'.split()
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def load_config(config_file=default_config_file):
+  # Load config and validate it. Return the user values as a dict.
+  if not isfile(config_file):
+    msg = "File not found at: {}".format(config_file)
+    raise FileNotFoundError(msg)
+  config = configparser.ConfigParser()
+  with open(config_file) as f:
+    config.read_file(f)
+  # Check for expected config.
+  for section in expected_sections:
+    if not config.has_section(section):
+      msg = "Section [{}] not found in config file {}".format(section, config_file)
+      raise KeyError(msg)
+  result = {}
+  for user_key in expected_user_keys:
+    if not config.has_option(section='user', option=user_key):
+      msg = "Option '{}' not found in section [user] of config file {}".format(user_key, config_file)
+      raise KeyError(msg)
+    result[user_key] = config.get('user', user_key)
+  result['domains'] = []
+  if config.has_option(section='node', option='domains'):
+    result['domains'] = parse_domains(config.get('node', 'domains'))
+    if not result['domains']:
+      msg = "Option 'domains' in section [node] of config file {} is empty.".format(config_file)
+      raise ValueError(msg)
+  deb("Loaded config from {}".format(config_file))
+  return result
+
+
+
+
+def parse_domains(value):
+  # Returns a list of domains from a string of domains separated by commas and/or whitespace.
+  return value.replace(',', ' ').split()
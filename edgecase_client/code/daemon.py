@@ -0,0 +1,172 @@
+# Imports
+import os
+import json
+import socket
+import logging
+import threading
+import socketserver
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - The daemon is a long-running process that listens on a Unix domain socket, so that work (e.g. loading config and keys, importing the GPG stack, opening connections) can be done once and reused by many short-lived client processes.
+# - Protocol: the client connects, sends one request as a line of JSON, and receives one response as a line of JSON. Then the connection is closed.
+# - A request is either {"command": "stop"} or a command-specific dict that is passed to the daemon's handler, which returns the response dict.
+# - The socket file is only accessible by its owner.
+
+
+
+
+# Settings
+default_socket_path = '.edgecase_daemon.sock'
+default_timeout = 600  # seconds
+max_message_size = 64 * 1024 * 1024  # bytes
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def read_message(f):
+  line = f.readline(max_message_size + 1)
+  if not line:
+    raise ConnectionError("Connection closed before a message was received.")
+  if len(line) > max_message_size:
+    raise ValueError("Message is larger than {} bytes.".format(max_message_size))
+  return json.loads(line.decode('utf-8'))
+
+
+
+
+def write_message(f, message):
+  f.write(json.dumps(message).encode('utf-8') + b'\n')
+  f.flush()
+
+
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+  daemon_threads = True
+
+
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+
+
+  def handle(self):
+    try:
+      request = read_message(self.rfile)
+    except Exception as e:
+      log("Bad request: {}".format(e))
+      return
+    if request.get('command') == 'stop':
+      write_message(self.wfile, {'stopping': True})
+      # shutdown() waits for serve_forever to return, so it must be called from another thread.
+      threading.Thread(target=self.server.shutdown, daemon=True).start()
+      return
+    try:
+      response = self.server.handler(request)
+    except Exception as e:
+      response = {'error': '{}: {}'.format(type(e).__name__, e)}
+    write_message(self.wfile, response)
+
+
+
+
+def daemon_running(socket_path):
+  s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  try:
+    s.connect(socket_path)
+    return True
+  except OSError:
+    return False
+  finally:
+    s.close()
+
+
+
+
+def serve(socket_path, handler):
+  # Serve requests until a stop request is received, or until interrupted.
+  # handler: a function that takes a request dict and returns a response dict. It may be called from several threads at once.
+  socket_path = os.path.abspath(socket_path)
+  if os.path.exists(socket_path):
+    if daemon_running(socket_path):
+      raise OSError("A daemon is already listening on {}".format(socket_path))
+    # A stale socket file, left by a daemon that didn't shut down cleanly.
+    os.remove(socket_path)
+  old_umask = os.umask(0o177)
+  try:
+    server = UnixServer(socket_path, RequestHandler)
+  finally:
+    os.umask(old_umask)
+  server.handler = handler
+  log("Daemon listening on {}".format(socket_path))
+  try:
+    server.serve_forever()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.server_close()
+    try:
+      os.remove(socket_path)
+    except FileNotFoundError:
+      pass
+  log("Daemon stopped.")
+
+
+
+
+def send_request(socket_path, request, timeout=default_timeout):
+  # Returns the response dict.
+  s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  s.settimeout(timeout)
+  try:
+    try:
+      s.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+      msg = "No daemon is listening on {}. Start one with: python3 cli.py --task daemon".format(socket_path)
+      raise ConnectionError(msg)
+    f = s.makefile('rwb')
+    write_message(f, request)
+    response = read_message(f)
+    f.close()
+  finally:
+    s.close()
+  return response
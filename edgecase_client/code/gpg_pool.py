@@ -0,0 +1,222 @@
+# Imports
+import queue
+import shutil
+import logging
+import tempfile
+import threading
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - stateless_gpg creates a new keyring and imports the keys for every operation. For a batch of articles, key import becomes the largest fixed cost per article.
+# - A Keyring is a persistent GPG home directory. Each key is imported into it once, and is then looked up by fingerprint.
+# - A KeyringPool holds up to size warm Keyrings. Each operation checks out a Keyring that no other thread is using, so that concurrent gpg processes don't contend for the same keyring locks, and returns it afterwards. A new Keyring is created only when all of them are in use and there are fewer than size. Otherwise, the operation waits for one. So the pool stays warm, and doesn't grow, across batches that each start new threads (e.g. in the daemon).
+# - GPG commands are run directly (no shell) via util.misc.run_cmd.
+# - wrap_data() signs with the author's private key and encrypts to the recipient's public key, in one gpg call, with ASCII armour. With armor=False, it returns binary OpenPGP data instead, which is about 25% smaller.
+# - gpg already compresses the data (with zlib, by default) before encrypting it, so most of the remaining overhead is the armour.
+
+
+
+
+# Settings
+gpg_tool = 'gpg'
+gpg_timeout = 60  # seconds
+default_pool_size = 8
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+class Keyring:
+
+
+  def __init__(self):
+    gpg_path = util.misc.find_tool(gpg_tool)
+    if gpg_path is None:
+      msg = "Could not find the '{}' tool.".format(gpg_tool)
+      raise FileNotFoundError(msg)
+    self.gpg_path = gpg_path
+    self.home_dir = tempfile.mkdtemp(prefix='edgecase_keyring_')
+    # Key data hash -> fingerprint. A key is imported only the first time it is seen.
+    self.fingerprints = {}
+    self.lock = threading.Lock()
+
+
+  def command(self, args):
+    return [
+      self.gpg_path, '--homedir', self.home_dir,
+      '--batch', '--no-tty', '--yes', '--quiet',
+      '--trust-model', 'always', '--status-fd', '2',
+    ] + args
+
+
+  def gpg(self, args, input=None, binary=False):
+    cmd = self.command(args)
+    output, err, exit_code = util.misc.run_cmd(cmd, input=input, timeout=gpg_timeout, binary=binary)
+    if exit_code != 0:
+      msg = "GPG command failed (exit code {}): {}\n{}".format(exit_code, ' '.join(args), err)
+      raise ValueError(msg)
+    return output, err
+
+
+  def import_key(self, key_data):
+    # Returns the fingerprint of the (primary) key.
+    key_hash = util.hashing.sha256_data(key_data)
+    with self.lock:
+      fingerprint = self.fingerprints.get(key_hash)
+      if fingerprint is not None:
+        return fingerprint
+      output, err = self.gpg(['--import'], input=key_data)
+      # Example status line:
+      # [GNUPG:] IMPORT_OK 1 4C6E3B4F9F1A2B3C4D5E6F708192A3B4C5D6E7F8
+      fingerprints = []
+      for line in err.splitlines():
+        words = line.split()
+        if words[:2] == ['[GNUPG:]', 'IMPORT_OK'] and len(words) >= 4:
+          fingerprints.append(words[3])
+      if not fingerprints:
+        msg = "Could not find the fingerprint of the imported key in the GPG output:\n{}".format(err)
+        raise ValueError(msg)
+      fingerprint = fingerprints[0]
+      self.fingerprints[key_hash] = fingerprint
+      deb("Imported key {} into {}".format(fingerprint, self.home_dir))
+      return fingerprint
+
+
+  def wrap_args(self, private_key, public_key, armor):
+    signer = self.import_key(private_key)
+    recipient = self.import_key(public_key)
+    args = ['--armor'] if armor else []
+    return args + ['--local-user', signer, '--recipient', recipient]
+
+
+  def wrap_data(self, private_key, public_key, data, armor=True):
+    # Sign data with private_key and encrypt it to public_key. Returns ASCII-armoured output (a string), or, if armor is False, binary output (bytes).
+    args = self.wrap_args(private_key, public_key, armor)
+    output, err = self.gpg(args + ['--sign', '--encrypt'], input=data, binary=not armor)
+    return output
+
+
+  def wrap_file(self, private_key, public_key, input_file, output_file, armor=True):
+    # Like wrap_data, but gpg reads the data from input_file and writes its output to output_file, so the data is never held in memory.
+    args = self.wrap_args(private_key, public_key, armor)
+    self.gpg(args + ['--output', output_file, '--sign', '--encrypt', input_file])
+
+
+  def unwrap_data(self, private_key, data):
+    # Decrypt wrapped data (armoured or binary) with private_key. Returns bytes.
+    # The signature isn't checked, because the signer's public key needn't be in this keyring. gpg then exits with an error code even though decryption succeeded, so success is read from its status output instead.
+    self.import_key(private_key)
+    output, err, exit_code = util.misc.run_cmd(
+      self.command(['--decrypt']), input=data, timeout=gpg_timeout, binary=True,
+    )
+    if '[GNUPG:] DECRYPTION_OKAY' not in err:
+      msg = "GPG decryption failed (exit code {}):\n{}".format(exit_code, err)
+      raise ValueError(msg)
+    return output
+
+
+  def close(self):
+    # gpg 2.x starts an agent for each home directory. Stop it before removing the directory.
+    gpgconf_path = util.misc.find_tool('gpgconf')
+    if gpgconf_path is not None:
+      try:
+        util.misc.run_cmd([gpgconf_path, '--homedir', self.home_dir, '--kill', 'all'], timeout=gpg_timeout)
+      except Exception as e:
+        deb("Could not stop gpg-agent for {}: {}".format(self.home_dir, e))
+    shutil.rmtree(self.home_dir, ignore_errors=True)
+
+
+
+
+class KeyringPool:
+
+
+  def __init__(self, size=default_pool_size):
+    util.validate.validate_positive_integer(size, 'size', 'KeyringPool.__init__')
+    if size == 0:
+      raise ValueError('size must be at least 1.')
+    self.size = size
+    # Last in, first out, so that the most recently used Keyrings are reused first.
+    self.idle = queue.LifoQueue()
+    self.keyrings = []
+    self.lock = threading.Lock()
+
+
+  def acquire(self):
+    # Returns an idle Keyring, creating one if all are in use and the pool isn't full, and otherwise waiting for one. Pass it to release() afterwards.
+    try:
+      return self.idle.get_nowait()
+    except queue.Empty:
+      pass
+    with self.lock:
+      if len(self.keyrings) < self.size:
+        keyring = Keyring()
+        self.keyrings.append(keyring)
+        return keyring
+    return self.idle.get()
+
+
+  def release(self, keyring):
+    self.idle.put(keyring)
+
+
+  def wrap_data(self, private_key, public_key, data, armor=True):
+    keyring = self.acquire()
+    try:
+      return keyring.wrap_data(private_key, public_key, data, armor)
+    finally:
+      self.release(keyring)
+
+
+  def wrap_file(self, private_key, public_key, input_file, output_file, armor=True):
+    keyring = self.acquire()
+    try:
+      return keyring.wrap_file(private_key, public_key, input_file, output_file, armor)
+    finally:
+      self.release(keyring)
+
+
+  def close(self):
+    with self.lock:
+      keyrings = self.keyrings
+      self.keyrings = []
+      self.idle = queue.LifoQueue()
+    for keyring in keyrings:
+      keyring.close()
@@ -0,0 +1,133 @@
+# Imports
+import os
+import json
+import time
+import logging
+import threading
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+join = os.path.join
+isfile = os.path.isfile
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - The list cache keeps the most recent draft listing for each author, so that repeated listings within ttl seconds don't contact the node.
+# - Each entry also keeps the ETag and Last-Modified headers of the response that it came from. When an entry is older than ttl, the listing is revalidated with a conditional request (If-None-Match / If-Modified-Since). If the node answers 304 Not Modified, the entry is reused and its age is reset. A node that doesn't send these headers always answers with the full listing, so the cache then works by TTL alone.
+# - Uploading or deleting a draft through a Client removes that author's entry.
+# - One JSON file per author. Example:
+# {"version": 1, "author_name": "stjohn_piano", "fetched_at": 1620901862.1, "etag": "\"9f86d0\"", "last_modified": null, "drafts": [{"name": "smart_contract_deployment"}]}
+
+
+
+
+# Settings
+default_ttl = 5  # seconds
+cache_version = 1
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+class ListCache:
+
+
+  def __init__(self, cache_dir, ttl=default_ttl):
+    self.cache_dir = cache_dir
+    self.ttl = ttl
+    os.makedirs(cache_dir, exist_ok=True)
+
+
+  def path(self, author_name):
+    return join(self.cache_dir, author_name + '.json')
+
+
+  def get(self, author_name):
+    # Returns the entry, or None if there isn't a usable one.
+    path = self.path(author_name)
+    if not isfile(path):
+      return None
+    try:
+      with open(path) as f:
+        entry = json.load(f)
+    except (OSError, ValueError) as e:
+      log("Could not read list cache file {}: {}".format(path, e))
+      return None
+    if entry.get('version') != cache_version or entry.get('author_name') != author_name:
+      return None
+    return entry
+
+
+  def is_fresh(self, entry, max_age=None):
+    if max_age is None:
+      max_age = self.ttl
+    age = time.time() - entry['fetched_at']
+    return 0 <= age < max_age
+
+
+  def put(self, author_name, drafts, etag=None, last_modified=None):
+    entry = {
+      'version': cache_version,
+      'author_name': author_name,
+      'fetched_at': time.time(),
+      'etag': etag,
+      'last_modified': last_modified,
+      'drafts': drafts,
+    }
+    path = self.path(author_name)
+    tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    with open(tmp_path, 'w') as f:
+      json.dump(entry, f)
+    os.replace(tmp_path, path)
+    return entry
+
+
+  def touch(self, author_name, entry):
+    # The node confirmed that the entry is still current (304). Reset its age.
+    return self.put(author_name, entry['drafts'], entry['etag'], entry['last_modified'])
+
+
+  def invalidate(self, author_name):
+    try:
+      os.remove(self.path(author_name))
+    except FileNotFoundError:
+      pass
@@ -0,0 +1,148 @@
+# Imports
+import time
+import logging
+import threading
+
+
+
+
+# Relative imports
+from .. import util
+from . import api
+from . import mock_node
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - A load test runs a number of concurrent clients against a node. Each client has its own APIClient (and therefore its own connection pool), runs on its own thread, and performs rounds of upload_draft, list_drafts and delete_draft, one request at a time.
+# - Uploaded drafts are unwrapped placeholder articles of payload_size bytes, each with a unique uri_title. They are meant for a mock node, not for a real one.
+# - If no domain is given, a MockNode is started in this process and used.
+# - Retries are off, so each failure is counted.
+
+
+
+
+# Settings
+default_clients = 8
+default_rounds = 50
+default_payload_size = 10 * 1024  # bytes
+operations = ['upload_draft', 'list_drafts', 'delete_draft']
+author_name = 'load_test'
+long_user_id = '1'
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def make_payload(uri_title, payload_size):
+  header = '<uri_title>{}</uri_title>\n'.format(uri_title)
+  padding = 'x' * max(0, payload_size - len(header) - 1)
+  return header + padding + '\n'
+
+
+
+
+def run_client(domain, client_id, rounds, payload_size, timeout, records):
+  # records: a dict of operation -> list of (duration, ok). Each client appends to its own lists, so no lock is needed.
+  c = api.APIClient(domain=domain, timeout=timeout, concurrency=1, retries=0)
+  try:
+    for i in range(rounds):
+      name = 'load_test_{c}_{i}'.format(c=client_id, i=i)
+      calls = [
+        ('upload_draft', c.upload_draft(author_name, long_user_id, make_payload(name, payload_size))),
+        ('list_drafts', c.list_drafts(author_name)),
+        ('delete_draft', c.delete_draft(author_name, long_user_id, name)),
+      ]
+      for operation, coroutine in calls:
+        start = time.perf_counter()
+        try:
+          result = c.run(coroutine)
+          ok = not hasattr(result, 'ok') or result.ok
+        except Exception as e:
+          deb("{o} failed: {e}".format(o=operation, e=e))
+          ok = False
+        records[operation].append((time.perf_counter() - start, ok))
+  finally:
+    c.close()
+
+
+
+
+def load_test(
+    domain = None,
+    clients = default_clients,
+    rounds = default_rounds,
+    payload_size = default_payload_size,
+    timeout = api.default_timeout,
+    latency = 0,
+    error_rate = 0,
+    ):
+  # Returns a list of rows (dicts): one per operation, and a total.
+  # latency and error_rate configure the mock node, if one is started.
+  node = None
+  if domain is None:
+    node = mock_node.MockNode(port=0, latency=latency, error_rate=error_rate).start()
+    domain = node.domain
+  per_client = [{x: [] for x in operations} for i in range(clients)]
+  threads = [
+    threading.Thread(
+      target = run_client,
+      args = (domain, i, rounds, payload_size, timeout, per_client[i]),
+    )
+    for i in range(clients)
+  ]
+  start = time.perf_counter()
+  for t in threads:
+    t.start()
+  for t in threads:
+    t.join()
+  elapsed = max(time.perf_counter() - start, 1e-9)
+  if node is not None:
+    node.stop()
+  rows = []
+  for operation in operations + ['total']:
+    if operation == 'total':
+      records = [r for x in per_client for op in operations for r in x[op]]
+    else:
+      records = [r for x in per_client for r in x[operation]]
+    summary = util.stats.summarise_latencies([d for d, ok in records])
+    rows.append({
+      'operation': operation,
+      'requests': summary['count'],
+      'errors': len([ok for d, ok in records if not ok]),
+      'requests_per_s': '{:.1f}'.format(summary['count'] / elapsed),
+      'p50_ms': '{:.1f}'.format(summary['p50'] * 1000) if records else '',
+      'p99_ms': '{:.1f}'.format(summary['p99'] * 1000) if records else '',
+      'max_ms': '{:.1f}'.format(summary['max'] * 1000) if records else '',
+    })
+  return rows
@@ -0,0 +1,97 @@
+# Imports
+import os
+import json
+import logging
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+isfile = os.path.isfile
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - The manifest records what the node was last sent for each draft, so that a sync only uploads drafts that are new or have changed.
+# - Format: {"version": 1, "drafts": {<draft_name>: <entry>}}
+# - Example entry:
+# {"file": "drafts/article.txt", "sha256": "<hex>", "status": "ok", "uploaded_at": "2021-05-13 10:31:02"}
+
+
+
+
+# Settings
+default_manifest_file = '.edgecase_manifest.json'
+manifest_version = 1
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def new_manifest():
+  return {'version': manifest_version, 'drafts': {}}
+
+
+
+
+def load_manifest(manifest_file):
+  if not isfile(manifest_file):
+    log("No manifest found at {}. Starting a new one.".format(manifest_file))
+    return new_manifest()
+  with open(manifest_file) as f:
+    manifest = json.load(f)
+  version = manifest.get('version')
+  if version != manifest_version:
+    msg = "Manifest {} has version {}, but expected version {}.".format(
+      manifest_file, repr(version), manifest_version
+    )
+    raise ValueError(msg)
+  return manifest
+
+
+
+
+def save_manifest(manifest_file, manifest):
+  # Write to a temporary file and then rename it, so that an interrupted save doesn't corrupt the manifest.
+  tmp_file = manifest_file + '.tmp'
+  with open(tmp_file, 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+    f.write('\n')
+  os.replace(tmp_file, manifest_file)
+  deb("Saved manifest to {}".format(manifest_file))
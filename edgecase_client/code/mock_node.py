@@ -0,0 +1,350 @@
+# Imports
+import re
+import json
+import time
+import random
+import logging
+import hashlib
+import functools
+import threading
+import http.server
+import socketserver
+import urllib.parse
+
+
+
+
+# Relative imports
+from .. import util
+from . import api
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - A MockNode is a local stand-in for an Edgecase node. It implements the API endpoints that APIClient uses, and keeps drafts and assets in memory.
+# - It doesn't decrypt uploads. By default, an uploaded payload is stored as it is. A draft's name is its uri_title if the payload contains one, or otherwise is derived from the payload's hash. Pass an unwrap function (bytes -> bytes) to decrypt payloads, or unwrap_key (an armoured private key, e.g. of a throwaway key pair that stands in for the Edgecase key) to decrypt them with gpg. An asset's sha256 and size are then those of the decrypted asset, as the client expects.
+# - latency adds a delay of latency seconds, plus a random extra delay of up to jitter seconds, to every response.
+# - error_rate is the fraction of requests (chosen at random) that receive an error_status (by default, 503) response instead of being handled.
+# - Upload and delete requests must carry an edgecase_long_user_id cookie.
+# - A draft upload with the binary wrap format header is accepted, and the header is sent back to confirm the format. If accept_binary is False, it gets a 415 Unsupported Media Type response instead (as from a node that doesn't support binary uploads). If accept_binary is None, the header is ignored (as by a node that doesn't know it): the upload is accepted, but not confirmed.
+# - bytes_received counts the bytes of each request's line, headers and body (not including chunked transfer encoding framing).
+# - A draft listing supports the offset and limit query parameters (and says so with api.paging_header), and has an ETag. Pass paging=False to have it ignore them, like a node that doesn't support paging. A list request with a matching If-None-Match header gets a 304 Not Modified response.
+
+
+
+
+# Settings
+default_host = '127.0.0.1'
+default_port = 8765
+uri_title_pattern = re.compile(rb'<uri_title>([a-z0-9_]+)</uri_title>')
+routes = [
+  ('POST', api.upload_draft_path, 'upload_draft'),
+  ('GET', api.list_drafts_path, 'list_drafts'),
+  ('GET', api.delete_draft_path, 'delete_draft'),
+  ('POST', api.upload_asset_path, 'upload_asset'),
+  ('GET', api.asset_path, 'get_asset'),
+]
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def compile_route(path):
+  # '/api/v1/authors/{a}/drafts' -> a pattern that captures each {x} as a path segment.
+  pattern = re.escape(path)
+  pattern = re.sub(r'\\\{(\w+)\\\}', r'(?P<\1>[^/]+)', pattern)
+  return re.compile('^' + pattern + '$')
+
+
+
+
+compiled_routes = [(method, compile_route(path), name) for method, path, name in routes]
+
+
+
+
+def parse_multipart(content_type, body):
+  # Returns a dict of field name -> (file_name, data) for a multipart/form-data body.
+  match = re.search(r'boundary=([^;]+)', content_type or '')
+  if not match:
+    raise ValueError("No multipart boundary in Content-Type: {}".format(content_type))
+  boundary = b'--' + match.group(1).strip('"').encode('utf-8')
+  fields = {}
+  for part in body.split(boundary)[1:]:
+    if part.startswith(b'--'):
+      break
+    headers, _, data = part.partition(b'\r\n\r\n')
+    if data.endswith(b'\r\n'):
+      data = data[:-2]
+    headers = headers.decode('utf-8', 'replace')
+    name = re.search(r'name="([^"]*)"', headers)
+    file_name = re.search(r'filename="([^"]*)"', headers)
+    if name:
+      fields[name.group(1)] = (file_name.group(1) if file_name else None, data)
+  return fields
+
+
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+  daemon_threads = True
+
+
+
+
+class MockNode:
+
+
+  def __init__(
+      self,
+      host = default_host,
+      port = default_port,
+      latency = 0,
+      jitter = 0,
+      error_rate = 0,
+      error_status = 503,
+      unwrap = None,
+      accept_binary = True,
+      unwrap_key = None,
+      paging = True,
+      ):
+    self.host = host
+    self.port = port
+    self.latency = latency
+    self.jitter = jitter
+    self.error_rate = error_rate
+    self.error_status = error_status
+    self.unwrap = unwrap
+    self.keyring = None
+    if unwrap_key is not None:
+      from . import gpg_pool
+      self.keyring = gpg_pool.Keyring()
+      self.unwrap = functools.partial(self.keyring.unwrap_data, unwrap_key)
+    self.accept_binary = accept_binary
+    self.paging = paging
+    self.bytes_received = 0
+    self.lock = threading.Lock()
+    self.drafts = {}  # author_name -> {draft_name: sha256}
+    self.assets = {}  # author_name -> {sha256: metadata}
+    self.request_counts = {}
+    self.server = None
+    self.thread = None
+
+
+  @property
+  def domain(self):
+    # The value to pass to APIClient / Client as the domain.
+    return '{h}:{p}'.format(h=self.host, p=self.port)
+
+
+  def start(self):
+    # Serve requests on a background thread. If port is 0, a free port is chosen.
+    node = self
+
+    class Handler(RequestHandler):
+      pass
+
+    Handler.node = node
+    self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+    self.port = self.server.server_address[1]
+    self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+    self.thread.start()
+    log("Mock node listening on {}".format(self.domain))
+    return self
+
+
+  def stop(self):
+    if self.server is not None:
+      self.server.shutdown()
+      self.server.server_close()
+      self.server = None
+    if self.keyring is not None:
+      self.keyring.close()
+      self.keyring = None
+
+
+  def handle(self, method, path, headers, cookies, body, query=None):
+    # Returns status_code, content_type, response body (str), and optionally a dict of extra response headers.
+    if self.latency or self.jitter:
+      time.sleep(self.latency + random.uniform(0, self.jitter))
+    if self.error_rate and random.random() < self.error_rate:
+      return self.error_status, 'text/plain', 'Injected error.'
+    for route_method, pattern, name in compiled_routes:
+      match = pattern.match(path)
+      if match is None or route_method != method:
+        continue
+      with self.lock:
+        self.request_counts[name] = self.request_counts.get(name, 0) + 1
+      kwargs = match.groupdict()
+      if name in 'upload_draft delete_draft upload_asset'.split():
+        if not cookies.get('edgecase_long_user_id'):
+          return 403, 'text/plain', 'Missing edgecase_long_user_id cookie.'
+      return getattr(self, name)(headers=headers, body=body, query=query or {}, **kwargs)
+    return 404, 'text/plain', 'Not found: {} {}'.format(method, path)
+
+
+  def read_upload(self, headers, body):
+    fields = parse_multipart(headers.get('Content-Type'), body)
+    if 'data' not in fields:
+      raise ValueError("No 'data' field in upload.")
+    file_name, data = fields['data']
+    if self.unwrap is not None:
+      data = self.unwrap(data)
+    return file_name, data
+
+
+  def upload_draft(self, a, headers, body, query):
+    binary = headers.get(api.wrap_format_header) == 'binary'
+    if binary and self.accept_binary is False:
+      return 415, 'text/plain', 'Binary uploads are not supported.'
+    file_name, data = self.read_upload(headers, body)
+    sha256 = hashlib.sha256(data).hexdigest()
+    match = uri_title_pattern.search(data)
+    name = match.group(1).decode('ascii') if match else 'draft_' + sha256[:16]
+    with self.lock:
+      self.drafts.setdefault(a, {})[name] = sha256
+    if binary and self.accept_binary:
+      return 200, 'text/plain', 'Draft uploaded: {}'.format(name), {api.wrap_format_header: 'binary'}
+    return 200, 'text/plain', 'Draft uploaded: {}'.format(name)
+
+
+  def list_drafts(self, a, headers, body, query):
+    with self.lock:
+      names = sorted(self.drafts.get(a, {}).keys())
+    extra_headers = {}
+    if self.paging:
+      offset = int(query.get('offset', 0))
+      limit = query.get('limit')
+      names = names[offset:] if limit is None else names[offset:offset + int(limit)]
+      extra_headers[api.paging_header] = 'offset, limit'
+    result = {'data': [{'name': name} for name in names]}
+    text = json.dumps(result)
+    etag = '"{}"'.format(hashlib.sha256(text.encode('utf-8')).hexdigest()[:32])
+    extra_headers['ETag'] = etag
+    if headers.get('If-None-Match') == etag:
+      return 304, 'application/json', '', extra_headers
+    return 200, 'application/json', text, extra_headers
+
+
+  def delete_draft(self, a, n, headers, body, query):
+    with self.lock:
+      found = self.drafts.get(a, {}).pop(n, None) is not None
+    if not found:
+      return 200, 'text/plain', 'No draft found with name: {}'.format(n)
+    return 200, 'text/plain', 'Draft deleted: {}'.format(n)
+
+
+  def upload_asset(self, a, headers, body, query):
+    file_name, data = self.read_upload(headers, body)
+    sha256 = hashlib.sha256(data).hexdigest()
+    metadata = {'file_name': file_name, 'sha256': sha256, 'size': len(data)}
+    with self.lock:
+      self.assets.setdefault(a, {})[sha256] = metadata
+    return 200, 'text/plain', 'Asset uploaded: {}'.format(file_name)
+
+
+  def get_asset(self, a, h, headers, body, query):
+    with self.lock:
+      metadata = self.assets.get(a, {}).get(h)
+    if metadata is None:
+      return 404, 'text/plain', 'No asset found with sha256: {}'.format(h)
+    return 200, 'application/json', json.dumps({'data': metadata})
+
+
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+
+
+  # HTTP/1.1, so that clients can keep connections alive.
+  protocol_version = 'HTTP/1.1'
+  # The headers and the body are written separately. Without this, Nagle's algorithm and delayed ACKs add ~40 ms to each response on a kept-alive connection.
+  disable_nagle_algorithm = True
+  node = None
+
+
+  def do_GET(self):
+    self.dispatch('GET')
+
+
+  def do_POST(self):
+    self.dispatch('POST')
+
+
+  def read_body(self):
+    # Handles both a Content-Length body and a chunked (streamed) body.
+    if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+      chunks = []
+      while True:
+        size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+        if size == 0:
+          # Skip any trailers, up to the blank line.
+          while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+            pass
+          break
+        chunks.append(self.rfile.read(size))
+        self.rfile.readline()
+      return b''.join(chunks)
+    length = int(self.headers.get('Content-Length') or 0)
+    return self.rfile.read(length)
+
+
+  def dispatch(self, method):
+    body = self.read_body()
+    with self.node.lock:
+      self.node.bytes_received += len(self.raw_requestline) + len(self.headers.as_bytes()) + len(body)
+    cookies = {}
+    for item in (self.headers.get('Cookie') or '').split(';'):
+      key, _, value = item.strip().partition('=')
+      if key:
+        cookies[key] = value
+    path, _, query = self.path.partition('?')
+    query = dict(urllib.parse.parse_qsl(query))
+    try:
+      result = self.node.handle(method, path, self.headers, cookies, body, query)
+    except Exception as e:
+      result = 400, 'text/plain', '{}: {}'.format(type(e).__name__, e)
+    status, content_type, text = result[:3]
+    extra_headers = result[3] if len(result) > 3 else {}
+    data = text.encode('utf-8')
+    self.send_response(status)
+    for key, value in extra_headers.items():
+      self.send_header(key, value)
+    self.send_header('Content-Type', content_type)
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+
+  def log_message(self, format, *args):
+    deb(format % args)
@@ -0,0 +1,161 @@
+# Imports
+import time
+import logging
+import threading
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - A NodePool tracks a list of Edgecase node endpoints. For each node, it keeps a moving average of its latency (an exponentially-weighted moving average, EWMA) and its health.
+# - Nodes are ordered by health and then by latency. A node that hasn't been measured yet comes first among the healthy nodes, so that each node gets measured.
+# - A failure (connection error, timeout or 5xx response) marks a node as down for a cooldown period, which doubles with each consecutive failure (up to max_cooldown). A success marks it as healthy again. If every node is down, the one that will recover soonest is used.
+# - A domain may include a scheme (e.g. 'https://edgecase.net'). Otherwise, 'http://' is used.
+
+
+
+
+# Settings
+default_alpha = 0.3
+default_cooldown = 5  # seconds
+default_max_cooldown = 300  # seconds
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+class Node:
+
+
+  def __init__(self, domain):
+    self.domain = domain
+    self.base_uri = domain if '://' in domain else 'http://' + domain
+    self.latency = None  # seconds (EWMA)
+    self.failures = 0  # consecutive
+    self.down_until = 0
+    self.requests = 0
+    self.errors = 0
+    # Whether the node accepts binary (non-armoured) uploads: None until known.
+    self.binary_uploads = None
+    # Whether the node applies the offset and limit parameters to a draft listing: None until known.
+    self.paging = None
+
+
+  def is_healthy(self, now=None):
+    if now is None:
+      now = time.monotonic()
+    return self.down_until <= now
+
+
+
+
+class NodePool:
+
+
+  def __init__(
+      self,
+      domains,
+      alpha = default_alpha,
+      cooldown = default_cooldown,
+      max_cooldown = default_max_cooldown,
+      ):
+    if not domains:
+      raise ValueError("A node pool needs at least one domain.")
+    self.nodes = [Node(x) for x in domains]
+    self.alpha = alpha
+    self.cooldown = cooldown
+    self.max_cooldown = max_cooldown
+    self.lock = threading.Lock()
+
+
+  def __len__(self):
+    return len(self.nodes)
+
+
+  def ordered(self, exclude=()):
+    # Returns all nodes, best first: healthy nodes by latency, then nodes that are down, soonest-recovering first. Excluded nodes come last.
+    now = time.monotonic()
+
+    def key(node):
+      healthy = node.is_healthy(now)
+      latency = -1 if node.latency is None else node.latency
+      return (node in exclude, not healthy, 0 if healthy else node.down_until, latency)
+
+    with self.lock:
+      return sorted(self.nodes, key=key)
+
+
+  def choose(self, exclude=()):
+    return self.ordered(exclude)[0]
+
+
+  def record_success(self, node, latency=None):
+    with self.lock:
+      node.requests += 1
+      node.failures = 0
+      node.down_until = 0
+      if latency is not None:
+        if node.latency is None:
+          node.latency = latency
+        else:
+          node.latency = self.alpha * latency + (1 - self.alpha) * node.latency
+
+
+  def record_failure(self, node):
+    with self.lock:
+      node.requests += 1
+      node.errors += 1
+      node.failures += 1
+      cooldown = min(self.max_cooldown, self.cooldown * 2 ** (node.failures - 1))
+      node.down_until = time.monotonic() + cooldown
+    log("Node {d} failed ({n} in a row). Avoiding it for {c} seconds.".format(d=node.domain, n=node.failures, c=cooldown))
+
+
+  def report(self):
+    # Returns a list of rows (dicts), one per node, best first.
+    now = time.monotonic()
+    rows = []
+    for node in self.ordered():
+      rows.append({
+        'node': node.domain,
+        'healthy': 'yes' if node.is_healthy(now) else 'no',
+        'latency_ms': '' if node.latency is None else '{:.1f}'.format(node.latency * 1000),
+        'requests': node.requests,
+        'errors': node.errors,
+      })
+    return rows
@@ -0,0 +1,212 @@
+# Imports
+import time
+import queue
+import logging
+import threading
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - A Pipeline passes items through a sequence of stages. Each stage has its own pool of worker threads, and stages are connected by bounded queues.
+# - While one item is in a later stage (e.g. waiting on the network), the next items can be in earlier stages (e.g. being wrapped by gpg), so the batch time approaches that of the slowest stage rather than the sum of all stages.
+# - A full queue blocks the stage before it (backpressure), so at most (queue size + workers) items are held between any two stages, however many items there are.
+# - If a stage function raises, the item's error is recorded, and the item skips the remaining stages.
+# - For each stage, the time that its workers spend in the stage function (busy), waiting for input (starved) and waiting for space in the next queue (blocked) is recorded. Utilisation is busy time / (workers * wall time). The stage with the highest utilisation is the bottleneck.
+
+
+
+
+# Settings
+default_queue_size = 16
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+class Stage:
+
+
+  def __init__(self, name, func, workers=1, queue_size=default_queue_size):
+    # func takes an item's value and returns its new value.
+    # queue_size is the size of the queue in front of this stage.
+    if workers < 1:
+      raise ValueError("Stage {} must have at least 1 worker.".format(repr(name)))
+    self.name = name
+    self.func = func
+    self.workers = workers
+    self.queue_size = queue_size
+    self.reset()
+
+
+  def reset(self):
+    self.lock = threading.Lock()
+    self.items = 0
+    self.errors = 0
+    self.busy = 0
+    self.starved = 0
+    self.blocked = 0
+    self.running = self.workers
+
+
+  def add(self, busy, starved, blocked, error):
+    with self.lock:
+      self.items += 1
+      self.errors += 1 if error else 0
+      self.busy += busy
+      self.starved += starved
+      self.blocked += blocked
+
+
+
+
+class Item:
+
+
+  def __init__(self, index, value):
+    self.index = index
+    self.value = value
+    self.error = None
+    self.failed_stage = None
+
+
+
+
+class Pipeline:
+
+
+  def __init__(self, stages):
+    if not stages:
+      raise ValueError("A pipeline needs at least one stage.")
+    self.stages = stages
+    self.elapsed = 0
+
+
+  def run(self, values, callback=None):
+    # Returns a list of Items, in input order.
+    # callback, if given, is called with each Item (from the calling thread) as it leaves the pipeline.
+    # Each stage's queue gets one sentinel (None) per worker. The last worker of a stage to finish passes the sentinels on to the next stage.
+    for stage in self.stages:
+      stage.reset()
+    queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+    output = queue.Queue()
+    threads = []
+    start = time.perf_counter()
+
+    def feed():
+      # Always send the sentinels, even if iterating over values fails, so that the pipeline still finishes.
+      try:
+        for i, value in enumerate(values):
+          queues[0].put(Item(i, value))
+      finally:
+        for j in range(self.stages[0].workers):
+          queues[0].put(None)
+
+    def work(n):
+      stage = self.stages[n]
+      in_queue = queues[n]
+      last = n == len(self.stages) - 1
+      out_queue = output if last else queues[n + 1]
+      while True:
+        t0 = time.perf_counter()
+        item = in_queue.get()
+        t1 = time.perf_counter()
+        if item is None:
+          break
+        error = False
+        if item.error is None:
+          try:
+            item.value = stage.func(item.value)
+          except Exception as e:
+            item.error = e
+            item.failed_stage = stage.name
+            error = True
+        t2 = time.perf_counter()
+        out_queue.put(item)
+        t3 = time.perf_counter()
+        stage.add(t2 - t1, t1 - t0, t3 - t2, error)
+      with stage.lock:
+        stage.running -= 1
+        done = stage.running == 0
+      if done:
+        sentinels = 1 if last else self.stages[n + 1].workers
+        for j in range(sentinels):
+          out_queue.put(None)
+
+    threads.append(threading.Thread(target=feed, daemon=True))
+    for n, stage in enumerate(self.stages):
+      for j in range(stage.workers):
+        threads.append(threading.Thread(target=work, args=(n,), daemon=True))
+    for t in threads:
+      t.start()
+    results = {}
+    while True:
+      item = output.get()
+      if item is None:
+        break
+      results[item.index] = item
+      if callback is not None:
+        callback(item)
+    for t in threads:
+      t.join()
+    self.elapsed = time.perf_counter() - start
+    return [results[i] for i in range(len(results))]
+
+
+  def report(self):
+    # Returns a list of rows (dicts), one per stage, for the last run.
+    wall = max(self.elapsed, 1e-9)
+    rows = []
+    for stage in self.stages:
+      capacity = stage.workers * wall
+      rows.append({
+        'stage': stage.name,
+        'workers': stage.workers,
+        'items': stage.items,
+        'errors': stage.errors,
+        'busy_s': '{:.2f}'.format(stage.busy),
+        'utilisation': '{:.0%}'.format(stage.busy / capacity),
+        'starved': '{:.0%}'.format(stage.starved / capacity),
+        'blocked': '{:.0%}'.format(stage.blocked / capacity),
+      })
+    return rows
+
+
+  def bottleneck(self):
+    # Returns the name of the stage with the highest utilisation in the last run.
+    return max(self.stages, key=lambda x: x.busy / x.workers).name
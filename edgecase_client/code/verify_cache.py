@@ -0,0 +1,270 @@
+# Imports
+import os
+import pickle
+import hashlib
+import logging
+import functools
+import threading
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+join = os.path.join
+isdir = os.path.isdir
+isfile = os.path.isfile
+dirname = os.path.dirname
+abspath = os.path.abspath
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - The cache maps (file content hash, verify options, edgecase_article version) to the verified article object, pickled, one file per entry.
+# - The edgecase_article version is the submodule's git commit, read from its git metadata (importing the package is slow). If there is no git metadata (e.g. in an exported copy), a hash of the package's source files is used instead. So entries made by an older edgecase_article aren't reused. Note: uncommitted changes to the submodule don't change its commit.
+# - A hit touches the entry's mtime. When the cache grows past max_bytes, the entries with the oldest mtimes are removed (i.e. least-recently-used eviction).
+# - Entries are loaded with pickle, which can run arbitrary code, so only the user may be able to write to the cache. The cache directory is created with mode 700, and is used only if it is owned by the user and isn't writable by group or others (otherwise, VerifyCache raises ValueError). Entries are written with mode 600, and an entry that fails the same check is ignored. (These checks are skipped on platforms without POSIX user IDs.)
+# - Several processes can share a cache directory. Entries are written to a temporary file and then renamed into place.
+
+
+
+
+# Settings
+default_max_bytes = 100 * 1000 * 1000
+# Change this if the cached objects become incompatible with previously-cached ones.
+cache_format_version = '1'
+entry_extension = '.pickle'
+article_dir = join(dirname(dirname(abspath(__file__))), 'submodules', 'edgecase_article')
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+# Caches that have already been opened in this process, keyed by (cache_dir, max_bytes).
+caches = {}
+
+
+
+
+def get_cache(cache_dir, max_bytes=default_max_bytes):
+  key = (cache_dir, max_bytes)
+  if key not in caches:
+    caches[key] = VerifyCache(cache_dir, max_bytes)
+  return caches[key]
+
+
+
+
+def read_git_head(repo_dir):
+  # Returns the commit that the git checkout at repo_dir is on, or None.
+  # In a submodule, .git is a file that points to the git directory.
+  git_dir = join(repo_dir, '.git')
+  if isfile(git_dir):
+    with open(git_dir) as f:
+      text = f.read().strip()
+    if not text.startswith('gitdir:'):
+      return None
+    git_dir = join(repo_dir, text[len('gitdir:'):].strip())
+  if not isdir(git_dir):
+    return None
+  with open(join(git_dir, 'HEAD')) as f:
+    head = f.read().strip()
+  if not head.startswith('ref:'):
+    return head
+  ref = head[len('ref:'):].strip()
+  ref_file = join(git_dir, ref)
+  if isfile(ref_file):
+    with open(ref_file) as f:
+      return f.read().strip()
+  packed_refs = join(git_dir, 'packed-refs')
+  if isfile(packed_refs):
+    with open(packed_refs) as f:
+      for line in f:
+        words = line.split()
+        if len(words) == 2 and words[1] == ref:
+          return words[0]
+  return None
+
+
+
+
+@functools.lru_cache(maxsize=None)
+def article_version():
+  try:
+    commit = read_git_head(article_dir)
+  except OSError as e:
+    deb("Could not read the edgecase_article commit: {}".format(e))
+    commit = None
+  if commit is not None:
+    return 'commit:' + commit
+  file_paths = []
+  for root, dirs, files in os.walk(article_dir):
+    dirs.sort()
+    file_paths += [join(root, x) for x in sorted(files) if x.endswith('.py')]
+  h = hashlib.sha256()
+  for file_path in file_paths:
+    h.update(os.path.relpath(file_path, article_dir).encode('utf-8'))
+    util.hashing.update_from_file(h, file_path)
+  return 'source:' + h.hexdigest()
+
+
+
+
+def check_owner(stat):
+  # stat: an os.stat result. Returns a description of the problem if the file isn't owned by the current user, or is writable by group or others. Otherwise, returns ''.
+  if not hasattr(os, 'getuid'):
+    return ''
+  if stat.st_uid != os.getuid():
+    return "isn't owned by the current user"
+  if stat.st_mode & 0o022:
+    return 'is writable by group or others'
+  return ''
+
+
+
+
+class VerifyCache:
+
+
+  def __init__(self, cache_dir, max_bytes=default_max_bytes):
+    util.validate.validate_string(cache_dir, 'cache_dir', 'VerifyCache.__init__')
+    util.validate.validate_positive_integer(max_bytes, 'max_bytes', 'VerifyCache.__init__')
+    self.cache_dir = cache_dir
+    self.max_bytes = max_bytes
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    problem = check_owner(os.stat(cache_dir))
+    if problem:
+      msg = "Refusing to use the verify cache directory {d}, because it {p}. Fix its permissions, or choose another directory.".format(d=cache_dir, p=problem)
+      raise ValueError(msg)
+    # Track the cache size in memory, so that a put doesn't need to scan the directory.
+    self.size = sum(size for path, size, mtime in self.entries())
+
+
+  def entries(self):
+    # Returns a list of (path, size, mtime) tuples.
+    result = []
+    for name in os.listdir(self.cache_dir):
+      if not name.endswith(entry_extension):
+        continue
+      path = join(self.cache_dir, name)
+      try:
+        stat = os.stat(path)
+      except FileNotFoundError:
+        # Removed by another process.
+        continue
+      result.append((path, stat.st_size, stat.st_mtime))
+    return result
+
+
+  def key(self, file_path, options):
+    # options: a dict of the verify options.
+    h = hashlib.sha256()
+    h.update(cache_format_version.encode('ascii'))
+    h.update(article_version().encode('ascii'))
+    h.update(repr(sorted(options.items())).encode('utf-8'))
+    util.hashing.update_from_file(h, file_path)
+    return h.hexdigest()
+
+
+  def path(self, key):
+    return join(self.cache_dir, key + entry_extension)
+
+
+  def get(self, key):
+    path = self.path(key)
+    try:
+      with open(path, 'rb') as f:
+        problem = check_owner(os.fstat(f.fileno()))
+        if problem:
+          log("Ignoring cache entry {}, because it {}.".format(path, problem))
+          return None
+        value = pickle.load(f)
+    except FileNotFoundError:
+      return None
+    except Exception as e:
+      log("Removing unreadable cache entry {}: {}".format(path, e))
+      self.remove(path)
+      return None
+    try:
+      os.utime(path)
+    except FileNotFoundError:
+      pass
+    deb("Cache hit: {}".format(key))
+    return value
+
+
+  def put(self, key, value):
+    try:
+      data = pickle.dumps(value)
+    except Exception as e:
+      log("Could not cache value for key {}: {}".format(key, e))
+      return
+    path = self.path(key)
+    tmp_path = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+      f.write(data)
+    os.replace(tmp_path, path)
+    self.size += len(data)
+    if self.size > self.max_bytes:
+      self.evict()
+
+
+  def remove(self, path):
+    try:
+      os.remove(path)
+    except FileNotFoundError:
+      pass
+
+
+  def evict(self):
+    # Remove least-recently-used entries until the cache is at most max_bytes.
+    entries = sorted(self.entries(), key=lambda x: x[2])
+    self.size = sum(size for path, size, mtime in entries)
+    for path, size, mtime in entries:
+      if self.size <= self.max_bytes:
+        break
+      self.remove(path)
+      self.size -= size
+      deb("Evicted: {}".format(path))
+
+
+  def clear(self):
+    for path, size, mtime in self.entries():
+      self.remove(path)
+    self.size = 0
@@ -0,0 +1,264 @@
+# Imports
+import os
+import time
+import select
+import struct
+import logging
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+join = os.path.join
+isfile = os.path.isfile
+basename = os.path.basename
+
+
+
+
+# Set up logger for this module. By default, it produces no output.
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+logger.setLevel(logging.ERROR)
+log = logger.info
+deb = logger.debug
+
+
+
+
+# Notes:
+# - A watcher reports the files in a directory that have been written. Only the directory itself is watched, not its subdirectories.
+# - On Linux, InotifyWatcher uses inotify (through ctypes), so a save is seen as soon as the file is closed. Elsewhere, or if inotify is unavailable, PollingWatcher compares the files' modification times and sizes every poll_interval seconds.
+# - watch() debounces the events: a file is handled once no further events for it have arrived for debounce seconds. An editor that saves by writing several times (or by writing a temporary file and renaming it) therefore causes one upload.
+# - watch_drafts() keeps the content hash of each draft, and only uploads a draft if its content has changed. Existing drafts are not uploaded when watching starts.
+# - Only .txt files whose names don't start with '.' are considered drafts (editor swap and backup files are ignored).
+
+
+
+
+# Settings
+default_debounce = 0.2  # seconds
+default_poll_interval = 0.5  # seconds
+# inotify event masks (from <sys/inotify.h>).
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+inotify_event_header = struct.Struct('iIII')
+
+
+
+
+def setup(
+    log_level = 'error',
+    debug = False,
+    log_timestamp = False,
+    log_file = None,
+    ):
+  # Configure logger for this module.
+  util.module_logger.configure_module_logger(
+    logger = logger,
+    logger_name = __name__,
+    log_level = log_level,
+    debug = debug,
+    log_timestamp = log_timestamp,
+    log_file = log_file,
+  )
+  deb('Setup complete.')
+
+
+
+
+def is_draft_file(path):
+  name = basename(path)
+  return name.endswith('.txt') and not name.startswith('.')
+
+
+
+
+def list_draft_files(directory):
+  return sorted(join(directory, x) for x in os.listdir(directory) if is_draft_file(x))
+
+
+
+
+class InotifyWatcher:
+
+
+  def __init__(self, directory):
+    import ctypes
+    import ctypes.util
+    self.directory = directory
+    libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    if not hasattr(libc, 'inotify_init1'):
+      raise OSError("inotify is not available.")
+    self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    if self.fd < 0:
+      errno = ctypes.get_errno()
+      raise OSError(errno, "inotify_init1 failed: {}".format(os.strerror(errno)))
+    mask = IN_CLOSE_WRITE | IN_MOVED_TO
+    wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+    if wd < 0:
+      errno = ctypes.get_errno()
+      os.close(self.fd)
+      raise OSError(errno, "inotify_add_watch failed for {}: {}".format(directory, os.strerror(errno)))
+
+
+  def wait(self, timeout):
+    # Returns the paths of the files that were written, or [] if nothing happened within timeout seconds.
+    ready, _, _ = select.select([self.fd], [], [], timeout)
+    if not ready:
+      return []
+    try:
+      data = os.read(self.fd, 64 * 1024)
+    except BlockingIOError:
+      return []
+    paths = []
+    i = 0
+    while i + inotify_event_header.size <= len(data):
+      wd, mask, cookie, length = inotify_event_header.unpack_from(data, i)
+      i += inotify_event_header.size
+      name = data[i:i + length].rstrip(b'\0')
+      i += length
+      if mask & IN_Q_OVERFLOW:
+        # Events were lost. Report every file, and let the caller check which ones have changed.
+        log("inotify queue overflowed. Rescanning {}".format(self.directory))
+        return list_draft_files(self.directory)
+      if name:
+        paths.append(join(self.directory, os.fsdecode(name)))
+    return paths
+
+
+  def close(self):
+    os.close(self.fd)
+
+
+
+
+class PollingWatcher:
+
+
+  def __init__(self, directory, poll_interval=default_poll_interval):
+    self.directory = directory
+    self.poll_interval = poll_interval
+    self.snapshot = self.scan()
+
+
+  def scan(self):
+    result = {}
+    for entry in os.scandir(self.directory):
+      if entry.is_file():
+        stat = entry.stat()
+        result[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return result
+
+
+  def wait(self, timeout):
+    time.sleep(min(timeout, self.poll_interval))
+    snapshot = self.scan()
+    paths = [x for x in snapshot if self.snapshot.get(x) != snapshot[x]]
+    self.snapshot = snapshot
+    return sorted(paths)
+
+
+  def close(self):
+    pass
+
+
+
+
+def make_watcher(directory, poll_interval=default_poll_interval, use_inotify=True):
+  if use_inotify:
+    try:
+      watcher = InotifyWatcher(directory)
+      log("Watching {} with inotify.".format(directory))
+      return watcher
+    except (OSError, AttributeError) as e:
+      log("Could not use inotify ({}). Polling instead.".format(e))
+  log("Watching {} by polling every {} seconds.".format(directory, poll_interval))
+  return PollingWatcher(directory, poll_interval)
+
+
+
+
+def watch(
+    directory, on_change,
+    debounce = default_debounce,
+    poll_interval = default_poll_interval,
+    use_inotify = True,
+    stop_event = None,
+    ):
+  # Call on_change(path) for each draft file in directory that is written, once it has been quiet for debounce seconds.
+  # Runs until stop_event (a threading.Event) is set, or until interrupted.
+  watcher = make_watcher(directory, poll_interval, use_inotify)
+  pending = {}  # path -> time of its latest event
+  try:
+    while stop_event is None or not stop_event.is_set():
+      now = time.monotonic()
+      timeout = 1
+      if pending:
+        timeout = max(0, min(pending.values()) + debounce - now)
+      for path in watcher.wait(timeout):
+        if is_draft_file(path):
+          pending[path] = time.monotonic()
+      now = time.monotonic()
+      ready = sorted(x for x in pending if now - pending[x] >= debounce)
+      for path in ready:
+        del pending[path]
+        if isfile(path):
+          on_change(path)
+  finally:
+    watcher.close()
+
+
+
+
+def watch_drafts(
+    client, directory,
+    callback = None,
+    debounce = default_debounce,
+    poll_interval = default_poll_interval,
+    use_inotify = True,
+    stop_event = None,
+    ):
+  # Upload each draft in directory whenever its content changes, using one long-lived client (so config, keys and HTTP connections stay warm).
+  # callback, if given, is called with a result dict for each draft that is uploaded (or fails).
+  hashes = util.hashing.sha256_files(list_draft_files(directory))
+
+  def on_change(article_file):
+    try:
+      sha256 = util.hashing.sha256_file(article_file)
+    except FileNotFoundError:
+      return
+    if hashes.get(article_file) == sha256:
+      deb("Unchanged: {}".format(article_file))
+      return
+    r = {
+      'article_file': article_file,
+      'status': 'error',
+      'duration': 0,
+      'result': '',
+    }
+    start = time.time()
+    try:
+      response = client.upload_draft(article_file)
+      r['status'] = 'ok' if response.ok else 'HTTP {}'.format(response.status_code)
+      r['result'] = response.text.strip()
+    except Exception as e:
+      r['result'] = '{}: {}'.format(type(e).__name__, e)
+    r['duration'] = time.time() - start
+    # Record the hash only after a successful upload, so that a failed draft is retried when it is next saved.
+    if r['status'] == 'ok':
+      hashes[article_file] = sha256
+    if callback is not None:
+      callback(r)
+
+  watch(directory, on_change, debounce, poll_interval, use_inotify, stop_event)
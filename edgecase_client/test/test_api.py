@@ -0,0 +1,169 @@
+# Imports
+import pytest
+
+
+
+
+# Relative imports
+from ..code import api
+from ..code import mock_node
+
+
+
+
+# Settings
+author_name = 'bob'
+names = ['draft_{:02d}'.format(i) for i in range(10)]
+
+
+
+
+@pytest.fixture(params=[True, False], ids=['paging', 'no_paging'])
+def client(request):
+  # An APIClient for a mock node that has 10 drafts, and that either applies or ignores the offset and limit parameters.
+  node = mock_node.MockNode(port=0, paging=request.param).start()
+  node.drafts[author_name] = {name: '' for name in names}
+  c = api.APIClient(domain=node.domain)
+  yield c
+  c.close()
+  node.stop()
+
+
+
+
+def list_names(c, **kwargs):
+  return [x['name'] for x in c.iter_drafts(author_name, **kwargs)]
+
+
+
+
+def test_iter_drafts(client):
+  assert list_names(client) == names
+
+
+
+
+def test_iter_drafts_page_size(client):
+  assert list_names(client, page_size=3) == names
+
+
+
+
+def test_iter_drafts_offset(client):
+  assert list_names(client, offset=5) == names[5:]
+
+
+
+
+def test_iter_drafts_offset_limit_page_size(client):
+  assert list_names(client, offset=2, limit=5, page_size=2) == names[2:7]
+
+
+
+
+def test_stream_list_drafts_offset_limit(client):
+  drafts, etag, last_modified = client.stream_list_drafts(author_name, offset=4, limit=3)
+  assert [x['name'] for x in drafts] == names[4:7]
+
+
+
+
+def test_no_paging_is_remembered(client):
+  list_names(client, offset=1, limit=1)
+  list_names(client, offset=1, limit=1)
+  node = client.nodes.choose()
+  assert node.paging is not None
+  if not node.paging:
+    # One discarded response, then the whole list, and then the whole list again without paging parameters.
+    assert node.requests == 3
+
+
+
+
+@pytest.fixture
+def failing_node():
+  # A mock node that answers every request with a 500 error.
+  node = mock_node.MockNode(port=0, error_rate=1, error_status=500).start()
+  yield node
+  node.stop()
+
+
+
+
+@pytest.fixture
+def node():
+  node = mock_node.MockNode(port=0).start()
+  node.drafts[author_name] = {name: '' for name in names}
+  yield node
+  node.stop()
+
+
+
+
+def test_fan_out_ignores_error_response(failing_node, node):
+  c = api.APIClient(domains=[failing_node.domain, node.domain], fan_out=2, retries=0)
+  try:
+    assert [x['name'] for x in c.run(c.list_drafts(author_name))] == names
+  finally:
+    c.close()
+
+
+
+
+def test_fail_over_after_500(failing_node, node):
+  c = api.APIClient(domains=[failing_node.domain, node.domain], retries=0)
+  try:
+    assert [x['name'] for x in c.run(c.list_drafts(author_name))] == names
+    assert not c.nodes.nodes[0].is_healthy()
+  finally:
+    c.close()
+
+
+
+
+class InvalidDraftNode(mock_node.MockNode):
+
+
+  # Rejects every draft, for a reason that has nothing to do with the wrap format.
+
+
+  def upload_draft(self, a, headers, body, query):
+    return 400, 'text/plain', 'Invalid draft: no title.'
+
+
+
+
+@pytest.mark.parametrize('accept_binary, binary_uploads, uploads', [
+  (True, True, 2),
+  (False, False, 3),
+  (None, False, 3),
+])
+def test_binary_upload_negotiation(accept_binary, binary_uploads, uploads):
+  # A node that rejects binary uploads, or accepts them without confirming the format, gets the first draft again, armoured, and later drafts armoured.
+  node = mock_node.MockNode(port=0, accept_binary=accept_binary).start()
+  c = api.APIClient(domain=node.domain)
+  try:
+    for i in range(2):
+      response = c.run(c.upload_draft(author_name, '1', b'binary draft', binary=True))
+      assert response.ok
+    assert c.nodes.choose().binary_uploads is binary_uploads
+    assert node.request_counts['upload_draft'] == uploads
+  finally:
+    c.close()
+    node.stop()
+
+
+
+
+def test_binary_upload_other_error():
+  # An error that isn't about the wrap format is returned, and doesn't decide the node's binary support.
+  node = InvalidDraftNode(port=0).start()
+  c = api.APIClient(domain=node.domain)
+  try:
+    response = c.run(c.upload_draft(author_name, '1', b'binary draft', binary=True))
+    assert response.status_code == 400
+    assert c.nodes.choose().binary_uploads is None
+    assert node.request_counts['upload_draft'] == 1
+  finally:
+    c.close()
+    node.stop()
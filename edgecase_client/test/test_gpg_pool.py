@@ -0,0 +1,53 @@
+# Imports
+import pytest
+import threading
+
+
+
+
+# Relative imports
+from .. import util
+from ..code import gpg_pool
+from ..code import benchmark
+
+
+
+
+# Settings
+gpg_found = util.misc.find_tool(gpg_pool.gpg_tool) is not None
+
+
+
+
+@pytest.fixture(scope='module')
+def keys():
+  keyring = gpg_pool.Keyring()
+  try:
+    yield benchmark.make_benchmark_keys(keyring)
+  finally:
+    keyring.close()
+
+
+
+
+@pytest.mark.skipif(not gpg_found, reason='gpg not found')
+def test_pool_does_not_grow_across_batches(keys):
+  private_key, public_key = keys
+  pool = gpg_pool.KeyringPool(size=4)
+  results = []
+
+  def wrap(i):
+    results.append(pool.wrap_data(private_key, public_key, 'draft {}'.format(i)))
+
+  try:
+    for batch in range(3):
+      threads = [threading.Thread(target=wrap, args=(i,)) for i in range(8)]
+      for t in threads:
+        t.start()
+      for t in threads:
+        t.join()
+      assert len(pool.keyrings) <= 4
+    assert len(results) == 24
+    assert all('BEGIN PGP MESSAGE' in x for x in results)
+  finally:
+    pool.close()
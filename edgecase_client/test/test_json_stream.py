@@ -0,0 +1,80 @@
+# Imports
+import json
+import pytest
+
+
+
+
+# Relative imports
+from .. import util
+
+
+
+
+# Shortcuts
+iter_array_items = util.json_stream.iter_array_items
+ParseError = util.json_stream.ParseError
+
+
+
+
+# Settings
+document = json.dumps({
+  'count': 12.5e-3,
+  'data': [
+    1.5, -2, 3e10, -0.25E+2, 0, 100,
+    'a "quoted" string é',
+    {'name': 'x', 'size': 1024, 'tags': [True, False, None]},
+    [],
+    {},
+  ],
+  'next': -7,
+})
+
+
+
+
+def test_whole_document():
+  items = list(iter_array_items([document], 'data'))
+  assert items == json.loads(document)['data']
+
+
+
+
+def test_split_at_every_offset():
+  expected = json.loads(document)['data']
+  for i in range(len(document) + 1):
+    chunks = [document[:i], document[i:]]
+    assert list(iter_array_items(chunks, 'data')) == expected, i
+
+
+
+
+def test_one_character_chunks():
+  expected = json.loads(document)['data']
+  assert list(iter_array_items(list(document), 'data')) == expected
+
+
+
+
+def test_number_split_after_decimal_point():
+  assert list(iter_array_items(['{"data": [1.', '5, 2]}'], 'data')) == [1.5, 2]
+
+
+
+
+def test_number_split_in_exponent():
+  assert list(iter_array_items(['{"data": [2e', '+3]}'], 'data')) == [2000.0]
+
+
+
+
+def test_missing_key():
+  assert list(iter_array_items([document], 'other')) == []
+
+
+
+
+def test_truncated_input():
+  with pytest.raises(ParseError):
+    list(iter_array_items([document[:-5]], 'data'))
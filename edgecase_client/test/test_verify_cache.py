@@ -0,0 +1,64 @@
+# Imports
+import os
+import stat
+import pytest
+
+
+
+
+# Relative imports
+from ..code import verify_cache
+
+
+
+
+# Settings
+posix = hasattr(os, 'getuid')
+options = {'verify_content': True}
+
+
+
+
+def test_put_get(tmp_path):
+  article_file = tmp_path / 'draft.txt'
+  article_file.write_text('draft')
+  cache = verify_cache.VerifyCache(str(tmp_path / 'cache'))
+  key = cache.key(str(article_file), options)
+  assert cache.get(key) is None
+  cache.put(key, {'data': 'draft'})
+  assert cache.get(key) == {'data': 'draft'}
+  # A change to the file changes the key.
+  article_file.write_text('draft 2')
+  assert cache.key(str(article_file), options) != key
+
+
+
+
+@pytest.mark.skipif(not posix, reason='needs POSIX user IDs')
+def test_private_permissions(tmp_path):
+  cache_dir = tmp_path / 'cache'
+  cache = verify_cache.VerifyCache(str(cache_dir))
+  assert stat.S_IMODE(os.stat(str(cache_dir)).st_mode) == 0o700
+  cache.put('k', 'v')
+  assert stat.S_IMODE(os.stat(cache.path('k')).st_mode) == 0o600
+
+
+
+
+@pytest.mark.skipif(not posix, reason='needs POSIX user IDs')
+def test_refuses_shared_directory(tmp_path):
+  cache_dir = tmp_path / 'shared'
+  cache_dir.mkdir()
+  os.chmod(str(cache_dir), 0o777)
+  with pytest.raises(ValueError):
+    verify_cache.VerifyCache(str(cache_dir))
+
+
+
+
+@pytest.mark.skipif(not posix, reason='needs POSIX user IDs')
+def test_ignores_writable_entry(tmp_path):
+  cache = verify_cache.VerifyCache(str(tmp_path / 'cache'))
+  cache.put('k', 'v')
+  os.chmod(cache.path('k'), 0o666)
+  assert cache.get('k') is None
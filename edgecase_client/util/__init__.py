@@ -2,6 +2,12 @@
 from . import module_logger
 from . import misc
 from . import validate
+from . import hashing
+from . import schema
+from . import stats
+from . import multipart
+from . import json_stream
+from . import pgp_armor
 
 
 
@@ -0,0 +1,84 @@
+# Imports
+import os
+import mmap
+import hashlib
+import concurrent.futures
+
+
+
+
+# Notes:
+# - This module replaces running 'shasum -a 256 <filepath>' in a subprocess. Its output is identical to that of shasum.
+# - Large files are hashed via mmap, in a single update() call. Smaller files are read in chunks.
+# - hashlib releases the GIL while hashing large buffers, so hashing many files on a thread pool uses multiple cores.
+
+
+
+
+# Settings
+chunk_size = 1024 * 1024  # bytes
+mmap_threshold = 16 * 1024 * 1024  # bytes
+default_workers = min(32, (os.cpu_count() or 1) + 4)
+
+
+
+
+def update_from_file(h, file_path):
+  # Feed the contents of a file into an existing hash object.
+  with open(file_path, 'rb') as f:
+    size = os.fstat(f.fileno()).st_size
+    if size >= mmap_threshold:
+      with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        h.update(m)
+      return h
+    while True:
+      chunk = f.read(chunk_size)
+      if not chunk:
+        break
+      h.update(chunk)
+  return h
+
+
+
+
+def sha256_file(file_path):
+  # Returns the SHA256 hash of the file's contents, as lowercase hex.
+  h = update_from_file(hashlib.sha256(), file_path)
+  return h.hexdigest()
+
+
+
+
+def sha256_files(file_paths, workers=default_workers):
+  # Hash many files concurrently. Returns a dict of file_path -> hex digest.
+  file_paths = list(file_paths)
+  if workers == 1 or len(file_paths) <= 1:
+    return {x: sha256_file(x) for x in file_paths}
+  with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+    digests = executor.map(sha256_file, file_paths)
+    return dict(zip(file_paths, digests))
+
+
+
+
+def sha256_data(data):
+  if isinstance(data, str):
+    data = data.encode('utf-8')
+  return hashlib.sha256(data).hexdigest()
+
+
+
+
+def shasum_line(file_path, digest=None):
+  # Returns the line that 'shasum -a 256 <file_path>' would print.
+  # Example:
+  # 9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08  drafts/article.txt
+  # shasum escapes backslashes and newlines in the file name, and marks the line with a leading backslash when it does so.
+  if digest is None:
+    digest = sha256_file(file_path)
+  name = file_path
+  prefix = ''
+  if '\\' in name or '\n' in name:
+    name = name.replace('\\', '\\\\').replace('\n', '\\n')
+    prefix = '\\'
+  return '{}{}  {}\n'.format(prefix, digest, name)
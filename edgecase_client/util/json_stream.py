@@ -0,0 +1,123 @@
+# Imports
+import json
+
+
+
+
+# Notes:
+# - iter_array_items parses a JSON object incrementally, from an iterator of text chunks (e.g. a response body as it arrives), and yields the items of one of its array values as soon as each item is complete. The whole document is never held in memory.
+# - Only the top level of the object is scanned. Each array item, and each other top-level value, is parsed with json.JSONDecoder.raw_decode once it has fully arrived.
+# - Example:
+# iter_array_items(['{"data": [{"name": "a"}, {"na', 'me": "b"}]}'], 'data') yields {'name': 'a'}, then {'name': 'b'}.
+
+
+
+
+# Settings
+whitespace = ' \t\n\r'
+number_chars = '0123456789+-.eE'
+# Discard the parsed part of the buffer once it is at least this long.
+compact_size = 64 * 1024  # characters
+
+
+
+
+class ParseError(ValueError):
+  pass
+
+
+
+
+class Scanner:
+
+
+  def __init__(self, chunks):
+    self.chunks = iter(chunks)
+    self.buffer = ''
+    self.pos = 0
+    self.eof = False
+    self.decoder = json.JSONDecoder()
+
+
+  def read_more(self):
+    # Returns False if there is no more input.
+    if self.eof:
+      return False
+    if self.pos >= compact_size:
+      self.buffer = self.buffer[self.pos:]
+      self.pos = 0
+    for chunk in self.chunks:
+      if chunk:
+        self.buffer += chunk
+        return True
+    self.eof = True
+    return False
+
+
+  def peek(self):
+    # Skip whitespace. Returns the next character, or '' at the end of the input.
+    while True:
+      while self.pos < len(self.buffer) and self.buffer[self.pos] in whitespace:
+        self.pos += 1
+      if self.pos < len(self.buffer):
+        return self.buffer[self.pos]
+      if not self.read_more():
+        return ''
+
+
+  def expect(self, chars):
+    c = self.peek()
+    if c == '' or c not in chars:
+      raise ParseError("Expected one of {e} at position {p}, found {c}.".format(
+        e=repr(chars), p=self.pos, c=repr(c) if c else 'end of input',
+      ))
+    self.pos += 1
+    return c
+
+
+  def value(self):
+    # Parse one complete JSON value.
+    self.peek()
+    while True:
+      try:
+        result, end = self.decoder.raw_decode(self.buffer, self.pos)
+      except ValueError as e:
+        if self.read_more():
+          continue
+        raise ParseError(str(e))
+      # A number that reaches the end of the buffer might continue in the next chunk. raw_decode may also have parsed only a prefix of it (e.g. '1' of '1.'), so check whether everything after it could still be part of the number.
+      if not self.eof and self.buffer[self.pos] not in '{["tfn':
+        if all(c in number_chars for c in self.buffer[end:]):
+          if self.read_more():
+            continue
+      self.pos = end
+      return result
+
+
+
+
+def iter_array_items(chunks, key):
+  # Yields the items of the array at the top-level key of a JSON object.
+  # Raises ParseError if the input isn't a JSON object or ends early. Nothing is yielded if the key isn't found.
+  s = Scanner(chunks)
+  s.expect('{')
+  if s.peek() == '}':
+    return
+  while True:
+    name = s.value()
+    if not isinstance(name, str):
+      raise ParseError("Expected an object key, found {}.".format(repr(name)))
+    s.expect(':')
+    if name == key and s.peek() == '[':
+      s.expect('[')
+      if s.peek() == ']':
+        s.pos += 1
+      else:
+        while True:
+          yield s.value()
+          if s.expect(',]') == ']':
+            break
+    else:
+      s.value()
+    if s.expect(',}') == '}':
+      return
@@ -1,5 +1,9 @@
 # Imports
+import shlex
 import string
+import shutil
+import functools
+import threading
 import subprocess
 
 
@@ -11,6 +15,13 @@ from . import validate as v
 
 
 
+# Settings
+# Characters that mean that a command string needs a shell.
+shell_chars = '|&;<>()$`\\"\'*?[]#~=%{}\n'
+
+
+
+
 def title_to_display_title(title):
   x = title.replace('_', ' ')
   # Capitalise first letter (checkpoint article titles have a lowercase first letter).
@@ -31,22 +42,64 @@ def get_integers_separated_by_hyphens(s):
 
 
 
+def format_table(rows):
+  # rows is a list of dicts with the same keys. The keys are used as column headers.
+  if not rows:
+    return ''
+  columns = list(rows[0].keys())
+  cells = [[format_cell(row[c]) for c in columns] for row in rows]
+  widths = [max(len(c), *[len(x[i]) for x in cells]) for i, c in enumerate(columns)]
+  lines = ['  '.join(c.ljust(w) for c, w in zip(columns, widths))]
+  for x in cells:
+    lines.append('  '.join(v.ljust(w) for v, w in zip(x, widths)))
+  return '\n'.join(line.rstrip() for line in lines)
+
+
+
+
+def format_cell(value):
+  if isinstance(value, float):
+    return '{:.3f}'.format(value)
+  return str(value)
+
+
+
+
 def shell_tool_exists(tool):
   if ' ' in tool:
     raise ValueError
-  tool = 'command -v {}'.format(tool)
-  output, exit_code = run_local_cmd(tool)
-  return not exit_code
+  return find_tool(tool) is not None
+
+
+
+
+@functools.lru_cache(maxsize=None)
+def find_tool(tool):
+  # Returns the path to the tool, or None if it isn't on the PATH.
+  # The result is cached for the life of the process, so each tool is looked up only once.
+  return shutil.which(tool)
 
 
 
 
-def run_local_cmd(cmd):
-  proc = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+def run_local_cmd(cmd, shell=None):
+  # cmd is a command string.
+  # If shell is None, the command runs through a shell only if it contains shell syntax (e.g. pipes or redirects). Otherwise it is split into argv and executed directly, which is much faster.
+  # Any output on stderr is treated as failure.
+  if shell is None:
+    shell = any(c in cmd for c in shell_chars)
+  args = cmd
+  if not shell:
+    args = shlex.split(cmd)
+    # Shell builtins (e.g. 'command') aren't executables, so they need a shell.
+    if not args or find_tool(args[0]) is None:
+      shell = True
+      args = cmd
+  proc = subprocess.Popen(args, shell=shell, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
   out, err = proc.communicate()
   exit_code = proc.wait()
-  output = out.decode('ascii')
-  err = err.decode('ascii')
+  output = out.decode('utf-8')
+  err = err.decode('utf-8')
   if err != '':
     output = 'COMMAND FAILED\n' + '$ ' + cmd + '\n' + err
     exit_code = 1
@@ -55,6 +108,69 @@ def run_local_cmd(cmd):
 
 
 
+def run_cmd(args, input=None, timeout=None, stream=None, cwd=None, binary=False):
+  # Execute a command directly (no shell).
+  # - args: the argv list, e.g. ['shasum', '-a', '256', file_path].
+  # - input: optional data (bytes or str) to write to the command's stdin.
+  # - timeout: optional, in seconds. If it expires, the command is killed and subprocess.TimeoutExpired is raised.
+  # - stream: optional function. If supplied, each line of stdout is passed to it as it arrives, instead of being buffered. The returned output is then ''.
+  # - binary: if True, the output is returned as bytes rather than decoded. Ignored if stream is supplied.
+  # Returns output (stdout), err (stderr), exit_code.
+  if isinstance(args, str):
+    raise TypeError("args must be a list of strings, not a string.")
+  if isinstance(input, str):
+    input = input.encode('utf-8')
+  if stream is None:
+    proc = subprocess.run(
+      args, input=input, timeout=timeout, cwd=cwd,
+      stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    output = proc.stdout if binary else proc.stdout.decode('utf-8')
+    err = proc.stderr.decode('utf-8')
+    return output, err, proc.returncode
+  stdin = subprocess.PIPE if input is not None else subprocess.DEVNULL
+  proc = subprocess.Popen(
+    args, stdin=stdin, cwd=cwd,
+    stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+  )
+  # Drain stderr (and feed stdin) on other threads, so that neither pipe can fill up and block the command.
+  err_chunks = []
+  threads = [threading.Thread(target=lambda: err_chunks.append(proc.stderr.read()))]
+  if input is not None:
+    def feed():
+      try:
+        proc.stdin.write(input)
+        proc.stdin.close()
+      except BrokenPipeError:
+        pass
+    threads.append(threading.Thread(target=feed))
+  timed_out = []
+  timer = None
+  if timeout is not None:
+    def kill():
+      timed_out.append(True)
+      proc.kill()
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+  for t in threads:
+    t.start()
+  for line in proc.stdout:
+    stream(line.decode('utf-8'))
+  exit_code = proc.wait()
+  for t in threads:
+    t.join()
+  if timer is not None:
+    timer.cancel()
+  proc.stdout.close()
+  proc.stderr.close()
+  if timed_out:
+    raise subprocess.TimeoutExpired(args, timeout)
+  err = b''.join(err_chunks).decode('utf-8')
+  return '', err, exit_code
+
+
+
+
 def stop(msg=None):
   if msg is not None:
     print(msg)
@@ -1,5 +1,6 @@
 # Imports
 import os
+import sys
 import logging
 
 
@@ -26,6 +27,27 @@ except Exception as e:
 # - We generally create a logger for each module (i.e. each python file).
 # - Each logger has its own name (which is its namespaced path, not just its name), and can have its own specific log level if this is useful.
 # - This function is used to automatically configure a logger based on the supplied settings.
+# - In a long-running process (e.g. the daemon), a logger is set up only once. Later calls only change its log level.
+# - Console output goes to whatever sys.stderr is when a record is logged, not when the logger was set up. So if sys.stderr is redirected (e.g. while the daemon runs a forwarded task), log output follows it.
+
+
+
+
+class StderrHandler(logging.StreamHandler):
+
+
+  # A StreamHandler that writes to the current sys.stderr.
+
+
+  @property
+  def stream(self):
+    return sys.stderr
+
+
+  @stream.setter
+  def stream(self, value):
+    # StreamHandler.__init__ sets the stream. Ignore it.
+    pass
 
 
 
@@ -34,8 +56,9 @@ def configure_module_logger(
     logger, logger_name, log_level, debug,
     log_timestamp, log_file,
     ):
-  # Avoid continually setting up a new logger on every new web request.
+  # Avoid continually setting up a new logger on every new web request. Only update the log level.
   if hasattr(logger, 'initialised') and logger.initialised:
+    logger.setLevelStr('debug' if debug else log_level)
     return
   # Validate input.
   v.validate_string(logger_name, 'logger_name', 'configure_module_logger')
@@ -64,6 +87,8 @@ def configure_module_logger(
   def setLevelStr(level_str):
     level = levels[level_str]
     logger.setLevel(level)
+    for handler in logger.handlers:
+      handler.setLevel(level)
     logger.level_str = level_str
 
   logger.setLevelStr = setLevelStr
@@ -115,13 +140,13 @@ def configure_module_logger(
   # Set up console handler.
   if not colorlog_imported:
     # 1) Standard console handler:
-    console_handler = logging.StreamHandler()
+    console_handler = StderrHandler()
     console_handler.setLevel(level)
     console_handler.setFormatter(log_formatter)
     logger.addHandler(console_handler)
   else:
     # 2) Colored console handler:
-    console_handler2 = colorlog.StreamHandler()
+    console_handler2 = StderrHandler()
     console_handler2.setLevel(level)
     console_handler2.setFormatter(log_formatter2)
     logger.addHandler(console_handler2)
@@ -0,0 +1,63 @@
+# Imports
+import uuid
+
+
+
+
+# Notes:
+# - This module builds a multipart/form-data request body with a single file field, as a generator of byte chunks.
+# - The file is read one chunk at a time, so memory use doesn't depend on the file's size.
+# - Passing the generator as the body of a request makes the requests library send it with chunked transfer encoding.
+# - The field headers match what requests sends for files={field_name: data}.
+# - multipart_file_stream returns a function that makes the body, rather than the body itself, so that the body can be made again for each attempt at sending it.
+
+
+
+
+# Settings
+chunk_size = 1024 * 1024  # bytes
+
+
+
+
+def multipart_stream(field_name, file_obj, file_name=None, boundary=None, chunk_size=chunk_size):
+  # file_obj: a file object opened in binary mode.
+  # Returns content_type, body. body is a generator of bytes.
+  if file_name is None:
+    file_name = field_name
+  if boundary is None:
+    boundary = uuid.uuid4().hex
+  content_type = 'multipart/form-data; boundary={}'.format(boundary)
+  preamble = '--{b}\r\nContent-Disposition: form-data; name="{n}"; filename="{f}"\r\n\r\n'.format(
+    b=boundary, n=field_name, f=file_name,
+  ).encode('utf-8')
+  epilogue = '\r\n--{}--\r\n'.format(boundary).encode('utf-8')
+
+  def body():
+    yield preamble
+    while True:
+      chunk = file_obj.read(chunk_size)
+      if not chunk:
+        break
+      yield chunk
+    yield epilogue
+
+  return content_type, body()
+
+
+
+
+def multipart_file_stream(field_name, file_path, file_name=None, boundary=None, chunk_size=chunk_size):
+  # Like multipart_stream, but reads from the file at file_path, and can be sent more than once (e.g. again to another node).
+  # Returns content_type, make_body. make_body is a function that returns a new body generator, which opens the file when it is first read from.
+  if boundary is None:
+    boundary = uuid.uuid4().hex
+
+  def make_body():
+    with open(file_path, 'rb') as f:
+      content_type, body = multipart_stream(field_name, f, file_name, boundary, chunk_size)
+      for chunk in body:
+        yield chunk
+
+  content_type = 'multipart/form-data; boundary={}'.format(boundary)
+  return content_type, make_body
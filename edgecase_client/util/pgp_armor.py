@@ -0,0 +1,115 @@
+# Imports
+import base64
+import binascii
+
+
+
+
+# Notes:
+# - This module converts OpenPGP data between binary form and ASCII armour (RFC 4880, section 6), without calling gpg.
+# - Armour base64-encodes the data, in lines of 64 characters, so it is about 33% larger than the binary data.
+# - dearmor() skips the armour's checksum line rather than checking it. The armoured text is expected to come from a local gpg process, and the binary data is itself integrity-protected.
+# - armor_file() reads and writes in blocks that are a multiple of 48 bytes (one line of output), so the whole file is never held in memory.
+
+
+
+
+# Settings
+armor_header = '-----BEGIN PGP MESSAGE-----'
+armor_footer = '-----END PGP MESSAGE-----'
+line_bytes = 48  # 64 base64 characters.
+block_size = line_bytes * 16 * 1024  # bytes
+crc24_init = 0xB704CE
+crc24_poly = 0x1864CFB
+
+
+
+
+def make_crc24_table():
+  table = []
+  for i in range(256):
+    crc = i << 16
+    for j in range(8):
+      crc <<= 1
+      if crc & 0x1000000:
+        crc ^= crc24_poly
+    table.append(crc & 0xFFFFFF)
+  return table
+
+
+
+
+crc24_table = make_crc24_table()
+
+
+
+
+def crc24(data, crc=crc24_init):
+  # Pass the previous result as crc to continue a checksum over several blocks.
+  table = crc24_table
+  for byte in data:
+    crc = ((crc << 8) & 0xFFFFFF) ^ table[(crc >> 16) ^ byte]
+  return crc
+
+
+
+
+def armor_lines(data):
+  text = base64.b64encode(data).decode('ascii')
+  return [text[i:i + 64] for i in range(0, len(text), 64)]
+
+
+
+
+def armor_checksum(crc):
+  return '=' + base64.b64encode(crc.to_bytes(3, 'big')).decode('ascii')
+
+
+
+
+def armor(data):
+  # Returns the armoured form of binary OpenPGP data, as a string.
+  lines = [armor_header, ''] + armor_lines(data)
+  lines += [armor_checksum(crc24(data)), armor_footer, '']
+  return '\n'.join(lines)
+
+
+
+
+def armor_file(input_file, output_file):
+  # Write the armoured form of the binary OpenPGP data in input_file to output_file.
+  crc = crc24_init
+  with open(input_file, 'rb') as f_in, open(output_file, 'w') as f_out:
+    f_out.write(armor_header + '\n\n')
+    while True:
+      block = f_in.read(block_size)
+      if not block:
+        break
+      crc = crc24(block, crc)
+      f_out.write('\n'.join(armor_lines(block)) + '\n')
+    f_out.write(armor_checksum(crc) + '\n' + armor_footer + '\n')
+
+
+
+
+def dearmor(text):
+  # Returns the binary OpenPGP data in an armoured message (a string).
+  lines = text.strip().splitlines()
+  if not lines or lines[0].strip() != armor_header:
+    raise ValueError("Armoured data must start with {}".format(repr(armor_header)))
+  # Skip the armour headers (e.g. 'Version: ...'), which end at the first blank line.
+  i = 1
+  while i < len(lines) and lines[i].strip():
+    i += 1
+  body = []
+  for line in lines[i + 1:]:
+    line = line.strip()
+    if line.startswith('=') or line == armor_footer:
+      break
+    body.append(line)
+  else:
+    raise ValueError("Armoured data must end with {}".format(repr(armor_footer)))
+  try:
+    return base64.b64decode(''.join(body), validate=True)
+  except binascii.Error as e:
+    raise ValueError("Invalid base64 in armoured data: {}".format(e))
@@ -0,0 +1,110 @@
+# Imports
+# (None)
+
+
+
+
+# Relative imports
+from . import validate as v
+
+
+
+
+# Notes:
+# - A schema is a dict of field name -> field spec. See field() below.
+# - compile_schema() turns a schema into a function that validates a list of records (dicts) in one call.
+# - The compiled validator doesn't stop at the first failure. It returns a report: a list of {'index': <record index>, 'errors': {<field>: <message>}}, containing only the records that failed.
+# - Error messages are only built for values that fail. A value that matches a field's fast pattern skips the full check.
+
+
+
+
+def field(check, required=True, fast=None, string=True):
+  # check: a function (value, record) that raises ValueError or TypeError if the value is invalid.
+  # required: whether a record must contain this field.
+  # fast: an optional precompiled pattern. A string value that fully matches it is valid, and the check is skipped.
+  # string: whether the value must be a string. This is checked before the check function is called.
+  return {'check': check, 'required': required, 'fast': fast, 'string': string}
+
+
+
+
+article_header_schema = {
+  'date': field(
+    lambda x, r: v.validate_date(x, 'date'),
+    fast = v.date_pattern,
+  ),
+  'author_name': field(
+    lambda x, r: v.validate_author_name(x),
+    fast = v.author_name_pattern,
+  ),
+  'uri_title': field(
+    lambda x, r: v.validate_uri_title(x),
+    fast = v.uri_title_pattern,
+  ),
+  'title': field(
+    lambda x, r: v.validate_title(x, r.get('article_type')),
+  ),
+  'article_type': field(
+    lambda x, r: v.validate_article_type(x),
+  ),
+  'signed_by_author': field(
+    lambda x, r: v.validate_signed_by_author(x),
+  ),
+  # Only datafeed and checkpoint articles have these fields.
+  'blockchain_name': field(
+    lambda x, r: v.validate_blockchain_name(x),
+    required = False,
+  ),
+  'datafeed_name': field(
+    lambda x, r: v.validate_datafeed_name(x),
+    required = False,
+  ),
+}
+
+
+
+
+def compile_schema(schema):
+  # Returns a function that validates a list of records and returns a report (see Notes at top).
+  fields = []
+  for name, spec in schema.items():
+    v.validate_string(name, 'name (of field)', 'compile_schema')
+    fields.append((name, spec['required'], spec['check'], spec['fast'], spec['string']))
+  fields = tuple(fields)
+
+  def validate_records(records):
+    report = []
+    for index, record in enumerate(records):
+      errors = None
+      for name, required, check, fast, string in fields:
+        if name not in record:
+          if required:
+            if errors is None:
+              errors = {}
+            errors[name] = 'Missing required field.'
+          continue
+        value = record[name]
+        if fast is not None and isinstance(value, str) and fast.fullmatch(value):
+          continue
+        try:
+          if string and not isinstance(value, str):
+            v.validate_string(value, name)
+          check(value, record)
+        except (ValueError, TypeError, IndexError) as e:
+          if errors is None:
+            errors = {}
+          msg = str(e)
+          if msg == '' or isinstance(e, IndexError):
+            msg = 'Invalid value {} ({}).'.format(repr(value), type(e).__name__)
+          errors[name] = msg
+      if errors is not None:
+        report.append({'index': index, 'errors': errors})
+    return report
+
+  return validate_records
+
+
+
+
+validate_article_headers = compile_schema(article_header_schema)
@@ -0,0 +1,93 @@
+# Imports
+import math
+import bisect
+
+
+
+
+def percentile(values, p):
+  # Nearest-rank percentile. p is in the range [0, 100].
+  # Returns None if there are no values.
+  if not values:
+    return None
+  if not 0 <= p <= 100:
+    raise ValueError("p must be in the range [0, 100], not {}.".format(p))
+  ordered = sorted(values)
+  rank = max(1, int(math.ceil(p / 100 * len(ordered))))
+  return ordered[rank - 1]
+
+
+
+
+def summarise_latencies(latencies):
+  # latencies: a list of durations, in seconds.
+  # Returns a dict with the count, mean, p50, p99 and max, in seconds.
+  if not latencies:
+    return {'count': 0, 'mean': None, 'p50': None, 'p99': None, 'max': None}
+  return {
+    'count': len(latencies),
+    'mean': sum(latencies) / len(latencies),
+    'p50': percentile(latencies, 50),
+    'p99': percentile(latencies, 99),
+    'max': max(latencies),
+  }
+
+
+
+
+class LatencyHistogram:
+
+
+  # Notes:
+  # - Records durations (in seconds) into fixed, logarithmically-spaced buckets, so memory use doesn't grow with the number of values.
+  # - A percentile is reported as the upper bound of the bucket that contains it (capped at the largest value seen), so it is accurate to within one bucket width (about 26% with 10 buckets per decade).
+
+
+  def __init__(self, min_value=0.001, max_value=100, buckets_per_decade=10):
+    decades = math.log10(max_value / min_value)
+    n = int(math.ceil(decades * buckets_per_decade))
+    self.bounds = [min_value * 10 ** (i / buckets_per_decade) for i in range(n + 1)]
+    # The last count is for values above the largest bound.
+    self.counts = [0] * (len(self.bounds) + 1)
+    self.count = 0
+    self.total = 0
+    self.max = 0
+
+
+  def record(self, value):
+    i = bisect.bisect_left(self.bounds, value)
+    self.counts[i] += 1
+    self.count += 1
+    self.total += value
+    self.max = max(self.max, value)
+
+
+  def percentile(self, p):
+    # Returns None if no values have been recorded.
+    if self.count == 0:
+      return None
+    if not 0 <= p <= 100:
+      raise ValueError("p must be in the range [0, 100], not {}.".format(p))
+    rank = max(1, int(math.ceil(p / 100 * self.count)))
+    cumulative = 0
+    for i, n in enumerate(self.counts):
+      cumulative += n
+      if cumulative >= rank:
+        break
+    if i == len(self.bounds):
+      return self.max
+    return min(self.bounds[i], self.max)
+
+
+  def summary(self):
+    # Returns a dict with the count, mean, p50, p90, p99 and max, in seconds.
+    if self.count == 0:
+      return {'count': 0, 'mean': None, 'p50': None, 'p90': None, 'p99': None, 'max': None}
+    return {
+      'count': self.count,
+      'mean': self.total / self.count,
+      'p50': self.percentile(50),
+      'p90': self.percentile(90),
+      'p99': self.percentile(99),
+      'max': self.max,
+    }
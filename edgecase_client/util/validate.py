@@ -21,6 +21,34 @@ import re
 date_pattern = re.compile(r'^\d{4}-\d{2}-\d{2}$')
 hex_digits = '0123456789abcdef'
 
+# Precompiled patterns for the fast paths of the validators below.
+# A validator first checks the whole value with one pattern match. Only if this fails does it look for the specific problem, in order to build a detailed error message.
+hex_pattern = re.compile(r'[0-9a-f]*')
+author_name_pattern = re.compile(r'[a-z0-9_]*')
+uri_title_pattern = re.compile(r'[a-z0-9_]*')
+title_pattern = re.compile(r'[A-Za-z0-9#&\'(),\-./:_"]*')
+checkpoint_title_pattern = re.compile(r'checkpoint_\d+')
+# Decimal patterns are compiled on first use, and then cached here, keyed by the number of decimal places.
+decimal_patterns = {}
+
+# Article file names.
+# Examples:
+# 2019-04-14_stjohn_piano_a_simple_api__json_input_output.txt
+# 2021-04-12_edgecase_datafeed_article_216_2021-04-12_stjohn_piano_discussion_crypto_messaging_apps.txt
+# 2017-06-28_edgecase_datafeed_article_1_checkpoint_0.txt
+# Without a list of known author names, the boundary between the author_name and the uri_title can't be found, so the pattern captures them together.
+file_name_pattern_template = (
+  r'(?:(?P<datafeed_date>\d{{4}}-\d{{2}}-\d{{2}})_edgecase_datafeed_article_(?P<datafeed_article_id>\d+)_)?'
+  r'(?:checkpoint_(?P<checkpoint_number>\d+)'
+  r'|(?P<date>\d{{4}}-\d{{2}}-\d{{2}})_{author_and_uri_title})'
+  r'\.txt'
+)
+file_name_pattern = re.compile(file_name_pattern_template.format(
+  author_and_uri_title = r'(?P<author_and_uri_title>[a-z0-9_]+)',
+))
+# Patterns for specific lists of author names are compiled on first use, and then cached here, keyed by the tuple of names.
+file_name_patterns = {}
+
 
 def build_error_msg(msg, value, name=None, location=None, kind=None):
   # Build out an expanded error message with useful detail.
@@ -46,6 +74,55 @@ def build_error_msg(msg, value, name=None, location=None, kind=None):
 
 
 
+# ### SECTION
+# Article file name parsing.
+
+
+
+
+def parse_file_name(file_name, author_names=None):
+  # Parse an article, signed article, or datafeed article file name in one regex match.
+  # Returns None if the file name doesn't have a recognised format. Otherwise, returns a dict with these keys (a value is None if that part is absent):
+  # - datafeed_date, datafeed_article_id: for datafeed articles.
+  # - checkpoint_number: for (datafeed) checkpoint articles.
+  # - date, author_and_uri_title: for articles.
+  # - author_name, uri_title: for articles, if author_names (a list of known author names) is supplied and one of them matches.
+  pattern = file_name_pattern
+  if author_names:
+    pattern = get_file_name_pattern(author_names)
+  match = pattern.fullmatch(file_name)
+  if match is None:
+    return None
+  result = match.groupdict()
+  if 'author_name' not in result:
+    result['author_name'] = None
+    result['uri_title'] = None
+  else:
+    result['author_and_uri_title'] = None
+    if result['author_name'] is not None:
+      result['author_and_uri_title'] = result['author_name'] + '_' + result['uri_title']
+  return result
+
+
+
+
+def get_file_name_pattern(author_names):
+  key = tuple(sorted(author_names))
+  pattern = file_name_patterns.get(key)
+  if pattern is None:
+    for author_name in key:
+      validate_author_name(author_name)
+    # Try longer names first, so that e.g. 'stjohn_piano_2' is preferred over 'stjohn_piano'.
+    names = sorted(key, key=len, reverse=True)
+    pattern = re.compile(file_name_pattern_template.format(
+      author_and_uri_title = r'(?P<author_name>{})_(?P<uri_title>[a-z0-9_]+)'.format('|'.join(names)),
+    ))
+    file_name_patterns[key] = pattern
+  return pattern
+
+
+
+
 # ### SECTION
 # Article property validation functions.
 
@@ -239,6 +316,8 @@ def validate_date(d, name=None, location=None, kind='date'):
 
 def validate_author_name(n):
   # Example: stjohn_piano
+  if author_name_pattern.fullmatch(n):
+    return
   permitted = string.ascii_lowercase + string.digits + '_'
   for c in n:
     if c not in permitted:
@@ -252,6 +331,8 @@ def validate_uri_title(u):
   # Examples:
   # stalky__co__by_rudyard_kipling_in_ambush
   # recipe_for_installing_kafka_2_5_0_as_a_systemd_service_on_ubuntu_16_04
+  if uri_title_pattern.fullmatch(u):
+    return
   permitted = string.ascii_lowercase + string.digits + '_'
   for c in u:
     if c not in permitted:
@@ -264,6 +345,8 @@ def validate_uri_title(u):
 def validate_title(t, article_type):
   if article_type == 'checkpoint_article':
     # Example: checkpoint_0
+    if checkpoint_title_pattern.fullmatch(t):
+      return
     if t[:10] != 'checkpoint':
       raise ValueError
     if t[10] != '_':
@@ -274,6 +357,8 @@ def validate_title(t, article_type):
     # Example: Discussion:_Crypto_Messaging_Apps
     if t[0] not in string.ascii_uppercase:
       raise ValueError('First character must be uppercase')
+    if title_pattern.fullmatch(t):
+      return
     permitted = string.ascii_letters + string.digits + "#&'(),-./:_" + '"'
     for c in t:
       if c not in permitted:
@@ -364,6 +449,8 @@ def validate_hex_length(s, n, name=None, location=None, kind=None):
 
 def validate_hex(s, name=None, location=None, kind='hex'):
   validate_string(s, name, location, kind)
+  if hex_pattern.fullmatch(s):
+    return
   # find indices of non-hex characters in the string.
   indices = [i for i in range(len(s)) if s[i] not in hex_digits]
   if len(indices) > 0:
@@ -377,14 +464,17 @@ def validate_string_is_decimal(
     s, dp=2, name=None, location=None, kind='integer',
     ):
   # dp = decimal places
-  string(s, name, location, kind)
+  validate_string(s, name, location, kind)
   if not isinstance(dp, int):
     msg = "which has type '{}', not 'int'.".format(type(dp).__name__)
     name2 = 'dp (i.e. the number of decimal places)'
     msg = build_error_msg(msg, dp, name=name2, location=location, kind=None)
     raise TypeError(msg)
-  regex = r'^\d*.\d{%d}$' % dp
-  decimal_pattern = re.compile(regex)
+  decimal_pattern = decimal_patterns.get(dp)
+  if decimal_pattern is None:
+    regex = r'^\d*.\d{%d}$' % dp
+    decimal_pattern = re.compile(regex)
+    decimal_patterns[dp] = decimal_pattern
   if not decimal_pattern.match(s):
     msg = 'which is not a valid {}-decimal-place decimal value.'.format(dp)
     msg = build_error_msg(msg, s, name, location, kind)
@@ -413,12 +503,14 @@ def validate_string_is_positive_integer(
   validate_string(s, name, location, kind)
   if s == '0':
     raise ValueError('0 is not a positive number.')
+  if s.isdigit():
+    return
   # find indices of non-digit characters in the string.
   indices = [i for i in range(len(s)) if not s[i].isdigit()]
   if len(indices) > 0:
     non_digit_chars = [s[i] for i in indices]
     msg = "where the chars at indices {} (with values {}) are not digits.".format(indices, ','.join(non_digit_chars))
-    msg = build_error_msg(msg, s, name, non_digit_chars, kind)
+    msg = build_error_msg(msg, s, name, location, kind)
     raise ValueError(msg)
 
 